@@ -2,8 +2,21 @@
 # Tadgh Henry, I made this all
 
 import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import partial
+from urllib.error import URLError
+from bulk_csv import (
+    find_csv_files,
+    parse_bulk_csv,
+    read_climate_id,
+    read_station_details,
+    split_months,
+)
 from db_operations import DBOperations
-from scrape_weather import WeatherScraper
+from pipeline import DatabaseWriter
+from retry import FailedMonthLedger
 
 
 class ScrapingActor:
@@ -14,10 +27,28 @@ class ScrapingActor:
 
         Initializes class attributes including weather database connection,
         weather scraper, plot operations, year range, and latest dates.
+        Neither touches the database or loads the scraper until first used.
         """
         self.weather_db = DBOperations()
-        self.weather_db.initialize_db()
-        self.weather_scraper = WeatherScraper()
+        self.scraper = None
+
+    @property
+    def weather_scraper(self):
+        """The scraper, created on first use so only scraping loads lxml and its ledger."""
+        if self.scraper is None:
+            from scrape_weather import WeatherScraper  # pylint: disable=import-outside-toplevel
+
+            self.scraper = WeatherScraper()
+            self.scraper.guards.failure_ledger = FailedMonthLedger(self.weather_db)
+        return self.scraper
+
+    @property
+    def station_id(self):
+        """The station being scraped, every database call is made for it."""
+        if self.scraper is None:
+            # A new scraper starts on the default station.
+            return DBOperations.DEFAULT_STATION
+        return str(self.scraper.weather_station_id)
 
     def database_fetch(self):
         """Fetches and saves weather data to the database."""
@@ -25,17 +56,24 @@ class ScrapingActor:
         # Setup database
         self.weather_db.initialize_db()
 
-        # Reset DB
-        self.weather_db.purge_data()
+        # Reset this stations data, other stations are left alone
+        self.weather_db.purge_data(station_id=self.station_id)
+
+        # Start from the cached first month so the site isnt asked for it every run.
+        first_year, first_month = self.station_start()
 
-        # scrape weather
-        current_weather = self.weather_scraper.scrape_weather()
-        self.weather_db.save_data(current_weather)
+        # scrape weather, each month is saved as soon as it is parsed
+        with DatabaseWriter(self.weather_db, self.station_id) as writer:
+            self.weather_scraper.stream_weather(
+                writer.submit,
+                start_year_override=first_year,
+                start_month_override=first_month,
+            )
         self.update_range()
 
     def update_range(self):
         """Updates the year range"""
-        latest_dates = self.weather_db.get_year_ends()
+        latest_dates = self.weather_db.get_year_ends(self.station_id)
 
         return {
             "lower": None if latest_dates is None else latest_dates[0],
@@ -48,17 +86,17 @@ class ScrapingActor:
         # Check last date in database
         # Give the last data to weather scraper as the start_date
         try:
-            last_date = self.weather_db.get_latest_date()
-            year = None
-            month = None
+            last_date = self.weather_db.get_latest_date(self.station_id)
             if last_date is not None:
                 logging.info("We got the updated end years for an update correctly")
                 (year, month) = last_date
+            else:
+                (year, month) = self.station_start()
 
-            current_weather = self.weather_scraper.scrape_weather(
-                start_year_override=year, start_month_override=month
-            )
-            self.weather_db.save_data(current_weather)
+            with DatabaseWriter(self.weather_db, self.station_id) as writer:
+                self.weather_scraper.stream_weather(
+                    writer.submit, start_year_override=year, start_month_override=month
+                )
             self.update_range()
         except TypeError as error:
             logging.warning(
@@ -67,6 +105,235 @@ class ScrapingActor:
             )
             self.database_fetch()
 
+    def station_metadata(self, refresh=False):
+        """
+        Get the current stations first and last available months.
+
+        Parameters:
+        - refresh (bool): Ask the site for the first month again instead of using the cache.
+
+        Returns:
+        - dict or None: The stations 'first' and 'last' (year, month), 'last' being the newest
+        saved month or None. None if the first month couldnt be found.
+
+        Description:
+        - The first month is looked up on the site once per station and kept in the
+        stations table, later runs skip that request.
+        """
+        station_id = self.station_id
+        metadata = None if refresh else self.weather_db.get_station(station_id)
+        if metadata is not None and metadata["first"] is not None:
+            return metadata
+
+        try:
+            earliest = self.weather_scraper.get_earliest_date()
+        except URLError as error:
+            logging.warning("Couldnt look up the first month for %s: %s", station_id, error)
+            return None
+        if earliest is None:
+            return None
+
+        self.weather_db.save_station(station_id, earliest["Year"], earliest["Month"])
+        return self.weather_db.get_station(station_id)
+
+    def station_start(self):
+        """Return the cached (year, month) the station starts at, (None, None) if unknown."""
+        metadata = self.station_metadata()
+        return (None, None) if metadata is None else metadata["first"]
+
+    def gap_fill(self):
+        """
+        Download only the months missing from the database.
+
+        Returns:
+        - int or None: The number of months downloaded, None if the stations first month
+        couldnt be found.
+
+        Description:
+        - Every month from the stations first month up to today that isnt marked complete
+        in the coverage table is scraped, holes in the middle of the record included.
+        - Months still open when they were saved stay incomplete, so they are picked up
+        again until they close.
+        """
+        station_id = self.station_id
+        self.weather_db.seed_coverage(station_id)
+
+        metadata = self.station_metadata()
+        if metadata is None:
+            return None
+
+        first_year, first_month = metadata["first"]
+        today = date.today()
+        complete = self.weather_db.get_complete_months(station_id)
+        missing = [
+            (year, month)
+            for year in range(first_year, today.year + 1)
+            for month in range(
+                first_month if year == first_year else 1,
+                (today.month if year == today.year else 12) + 1,
+            )
+            if (year, month) not in complete
+        ]
+        logging.info("Gap fill found %s missing months.", len(missing))
+
+        if missing:
+            with DatabaseWriter(self.weather_db, self.station_id) as writer:
+                self.weather_scraper.stream_months(missing, writer.submit)
+            self.update_range()
+        return len(missing)
+
+    def refresh_range(self, station_id=None, start=None, end=None):
+        """
+        Re-download a range of months and replace just those months in the database.
+
+        Parameters:
+        - station_id (str or None): The station to refresh, the current station if None.
+        - start (tuple): The first (year, month) to refresh.
+        - end (tuple or None): The last (year, month) to refresh, start if None.
+
+        Returns:
+        - list: The (year, month) months that couldnt be downloaded and were left as they were.
+
+        Description:
+        - Cached pages of the range are revalidated rather than trusted, so months the
+        site revised since are picked up.
+        - Every month is downloaded before anything is deleted, then the downloaded
+        months are swapped in by one transaction, see DBOperations.replace_months.
+        - A month whose page came back without any days is treated as failed, an empty
+        page shouldnt wipe a month.
+        """
+        station_id = self.station_id if station_id is None else str(station_id)
+        months = self.month_range(start, end or start)
+        logging.info("Refreshing %s months of station %s.", len(months), station_id)
+
+        scraper = self.weather_scraper
+        if scraper.page_cache is not None:
+            for year, month in months:
+                scraper.page_cache.expire(station_id, year, month)
+
+        downloaded = {}
+        lock = threading.Lock()
+
+        def collect(month_weather, month_key):
+            if month_weather:
+                with lock:
+                    downloaded[tuple(month_key[1:])] = month_weather
+
+        current_station = scraper.weather_station_id
+        try:
+            scraper.change_weather_station(station_id)
+            scraper.stream_months(months, collect)
+        finally:
+            scraper.change_weather_station(str(current_station))
+
+        if downloaded:
+            self.weather_db.replace_months(station_id, downloaded)
+            self.update_range()
+        return [month for month in months if month not in downloaded]
+
+    @staticmethod
+    def month_range(start, end):
+        """List the (year, month) pairs from start through end, both (year, month) tuples."""
+        first = int(start[0]) * 12 + int(start[1]) - 1
+        last = int(end[0]) * 12 + int(end[1]) - 1
+        return [(index // 12, index % 12 + 1) for index in range(first, last + 1)]
+
+    def retry_failed_months(self):
+        """
+        Re-scrape only the months in the failed month ledger.
+
+        Returns:
+        - int: The number of months still failing afterwards.
+        """
+        ledger = self.weather_scraper.guards.failure_ledger
+        months = [(year, month) for _, year, month in ledger.months(self.station_id)]
+        logging.info("Retrying %s failed months.", len(months))
+
+        if months:
+            # The same concurrent download and parse stages as a full fetch.
+            with DatabaseWriter(self.weather_db, self.station_id) as writer:
+                self.weather_scraper.stream_months(months, writer.submit)
+            self.update_range()
+
+        return len(ledger.months(self.station_id))
+
+    def fetch_stations(self, station_ids, requests_per_second=4, workers=8):
+        """
+        Download every month of several stations at once under one shared request rate.
+
+        Parameters:
+        - station_ids (iterable): The StationIDs to scrape.
+        - requests_per_second (float): Request cap shared by every station.
+        - workers (int): Threads shared by every station.
+
+        Returns:
+        - dict: The [done, total] month counts for each station.
+
+        Description:
+        - Months of the stations are interleaved by StationScheduler, each parsed month
+        is saved under its own station by the database writer.
+        - Days already saved are overwritten rather than purged first, unlike database_fetch.
+        """
+        from scheduler import StationScheduler  # pylint: disable=import-outside-toplevel
+
+        scheduler = StationScheduler(
+            self.weather_scraper, station_ids, requests_per_second, workers
+        )
+        with DatabaseWriter(self.weather_db, self.station_id) as writer:
+            progress = scheduler.run(writer.submit)
+        self.update_range()
+
+        return progress
+
+    def ingest_csv(self, directory, workers=None, station_id=None):
+        """
+        Load a folder of Environment Canada bulk data CSV files, no scraping involved.
+
+        Parameters:
+        - directory (str): Folder of daily bulk data *.csv files, per station or per year.
+        - workers (int or None): Processes parsing files, defaults to one per core.
+        - station_id (str or None): The station the files were downloaded for, the
+        current station if None. The files name it by Climate ID, which isnt a StationID.
+
+        Returns:
+        - int: The number of days read from the files.
+
+        Description:
+        - Files are parsed in a process pool, each finished file is handed to the
+        database writer so loading overlaps the parsing.
+        - The stations name, province and location are saved from the first file.
+        - Every day is saved under station_id, so only files with the first files
+        Climate ID are loaded. Files from other stations are logged and skipped.
+        - Each month read is recorded in the coverage table like a scraped month, so
+        gap_fill doesnt download it again.
+        """
+        from tqdm import tqdm  # pylint: disable=import-outside-toplevel
+
+        station_id = self.station_id if station_id is None else str(station_id)
+        paths = find_csv_files(directory)
+        logging.info("Ingesting %s bulk data files from %s.", len(paths), directory)
+        climate_id = None
+        if paths:
+            climate_id = read_climate_id(paths[0])
+            self.weather_db.save_station(station_id, **read_station_details(paths[0]))
+
+        days = 0
+        with DatabaseWriter(
+            self.weather_db, station_id, batch_days=5000
+        ) as writer, ProcessPoolExecutor(
+            max_workers=workers
+        ) as executor, tqdm(total=len(paths), desc="Loading CSV: ") as progress_bar:
+            for file_weather in executor.map(
+                partial(parse_bulk_csv, climate_id=climate_id), paths, chunksize=4
+            ):
+                for (year, month), month_weather in split_months(file_weather).items():
+                    writer.submit(month_weather, (station_id, year, month))
+                days += len(file_weather)
+                progress_bar.update(1)
+        self.update_range()
+
+        return days
+
     def empty_database(self, burn=False):
         """Wrapper for the database purge method"""
         self.weather_db.purge_data(burn)
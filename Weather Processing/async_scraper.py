@@ -0,0 +1,329 @@
+"""Asyncio scraping engine that reuses persistent HTTP/1.1 connections."""
+
+import asyncio
+import logging
+import ssl
+from collections import namedtuple
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+HTTPResponse = namedtuple("HTTPResponse", ["status", "headers", "body"])
+
+
+class ConnectionPool:
+    """A small pool of keep-alive HTTP/1.1 connections to a single host."""
+
+    def __init__(self, base_url, max_connections=8, timeout=30):
+        """
+        Initialize the pool for the host found in base_url.
+
+        Parameters:
+        - base_url (str): Any url on the host the pool will talk to.
+        - max_connections (int): The most sockets the pool will ever open at once.
+        - timeout (int): Seconds to wait on connecting or reading before giving up.
+        """
+        parts = urlsplit(base_url)
+        use_ssl = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if use_ssl else 80)
+        self.timeout = timeout
+        self.ssl_context = ssl.create_default_context() if use_ssl else None
+
+        self.idle = []
+        self.slots = asyncio.Semaphore(max_connections)
+
+        # Number of sockets opened over the pools lifetime, handy for benchmarks.
+        self.connections_opened = 0
+
+    async def open_connection(self):
+        """Open a new connection to the pools host."""
+        self.connections_opened += 1
+        return await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=self.ssl_context,
+                server_hostname=self.host if self.ssl_context else None,
+            ),
+            self.timeout,
+        )
+
+    async def request(self, path, headers=None):
+        """
+        Send a GET request for path over a pooled connection.
+
+        Parameters:
+        - path (str): The path and query string to request.
+        - headers (dict or None): Extra request headers.
+
+        Returns:
+        - HTTPResponse: The status code, lower-cased response headers and body bytes.
+
+        Description:
+        - Reuses an idle connection when one is available, otherwise opens a new one.
+        - A reused connection the server already closed is retried once on a fresh socket.
+        """
+        async with self.slots:
+            while self.idle:
+                connection = self.idle.pop()
+                try:
+                    return await self.send(connection, path, headers)
+                except (OSError, asyncio.IncompleteReadError, ConnectionError):
+                    # Server dropped the idle socket, fall through to a new one.
+                    logging.info("Stale pooled connection, reconnecting.")
+
+            connection = await self.open_connection()
+            return await self.send(connection, path, headers)
+
+    async def send(self, connection, path, headers):
+        """Write the request on connection and read back the full response."""
+        reader, writer = connection
+        request_lines = [
+            f"GET {path} HTTP/1.1",
+            f"Host: {self.host}",
+            "Connection: keep-alive",
+            "Accept-Encoding: identity",
+        ]
+        request_lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(request_lines) + "\r\n\r\n").encode("latin-1"))
+
+        try:
+            await writer.drain()
+            response, keep_alive = await asyncio.wait_for(
+                self.read_response(reader), self.timeout
+            )
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive:
+            self.idle.append(connection)
+        else:
+            writer.close()
+        return response
+
+    async def read_response(self, reader):
+        """
+        Read a status line, headers and body from reader.
+
+        Returns:
+        - tuple: The HTTPResponse and whether the connection can be reused.
+        """
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed before a response was sent.")
+
+        version, status = status_line.decode("latin-1").split(None, 2)[:2]
+        status = int(status)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = (
+            version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        )
+
+        if status in (204, 304) or 100 <= status < 200:
+            body = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self.read_chunked(reader)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            # No framing, the body runs until the server closes the socket.
+            body = await reader.read()
+            keep_alive = False
+
+        return HTTPResponse(status, headers, body), keep_alive
+
+    async def read_chunked(self, reader):
+        """Read a chunked transfer-encoded body."""
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                # Skip any trailers up to the terminating blank line.
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    async def close(self):
+        """Close every idle connection."""
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ConnectionError):
+                pass
+
+
+class AsyncScraper:
+    """Drives a WeatherScraper's months through a shared connection pool."""
+
+    def __init__(self, weather_scraper, concurrency=8):
+        """
+        Initialize the engine.
+
+        Parameters:
+        - weather_scraper (WeatherScraper): Supplies the urls and parses the pages.
+        - concurrency (int): Requests in flight at once, also the most sockets opened.
+        """
+        self.weather_scraper = weather_scraper
+        self.concurrency = concurrency
+        self.pool = None
+
+    def run(self, months, consumer, progress_bar=None):
+        """
+        Scrape every (year, month) in months.
+
+        Parameters:
+        - months (list): (year, month) tuples to scrape.
+        - consumer (callable): Called in a worker thread as consumer(body,
+        (station_id, year, month)) with the raw page of each month that downloaded,
+        usually ParseStage.submit.
+        - progress_bar (tqdm or None): Updated once per finished month.
+        """
+        asyncio.run(self.scrape_months(months, consumer, progress_bar))
+
+    async def scrape_months(self, months, consumer, progress_bar):
+        """
+        Fan the months out over the pool and hand each downloaded page to consumer.
+
+        Description:
+        - concurrency workers take months from a queue holding at most concurrency
+        months, so a long range never has a task waiting for every month at once.
+        """
+        self.pool = ConnectionPool(
+            self.weather_scraper.url_sections[0], self.concurrency
+        )
+        station_id = self.weather_scraper.weather_station_id
+        queue = asyncio.Queue(maxsize=self.concurrency)
+
+        async def work():
+            while (job := await queue.get()) is not None:
+                year, month, body = await self.download_month(*job)
+                if body is not None:
+                    # Parsing and a full writer queue both block, so neither runs on
+                    # the event loop the other requests are waiting on.
+                    await asyncio.to_thread(consumer, body, (station_id, year, month))
+                if progress_bar is not None:
+                    progress_bar.update(1)
+
+        workers = [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        try:
+            for job in months:
+                await queue.put(job)
+            # One stop marker per worker, each leaves once the months ahead of it are done.
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await self.pool.close()
+
+    async def download_month(self, year, month):
+        """
+        Download one month, going through the scrapers page cache.
+
+        Returns:
+        - tuple: The year, month and that months raw page, None if the request failed.
+
+        Description:
+        - Uses the scrapers retry policy, circuit breaker and failure ledger,
+        the same way WeatherScraper.download_month does.
+        - The page cache and ledger write to disk, they run in worker threads so the
+        event loop keeps serving the other requests meanwhile.
+        """
+        scraper = self.weather_scraper
+        entry = None
+        if scraper.page_cache is not None:
+            entry = await asyncio.to_thread(scraper.cached_page, year, month)
+        if entry is not None and entry.final:
+            return year, month, entry.body
+
+        station_id = scraper.weather_station_id
+        policy = scraper.guards.retry_policy
+        error = None
+        for attempt in range(policy.attempts):
+            await asyncio.sleep(scraper.guards.circuit_breaker.remaining())
+            try:
+                body = await self.fetch_month(year, month, entry)
+            except (OSError, ValueError, asyncio.IncompleteReadError) as failure:
+                error = failure
+                if not policy.is_retryable(failure):
+                    break
+                scraper.guards.circuit_breaker.record_failure()
+                if attempt + 1 < policy.attempts:
+                    await asyncio.sleep(policy.delay(attempt))
+                continue
+
+            scraper.guards.circuit_breaker.record_success()
+            if scraper.guards.failure_ledger is not None:
+                await asyncio.to_thread(
+                    scraper.guards.failure_ledger.resolve, station_id, year, month
+                )
+            return year, month, body
+
+        logging.warning(
+            "We had issues scraping from the following url %s and the following error %s",
+            scraper.build_url(year, month),
+            error,
+        )
+        if scraper.guards.failure_ledger is not None:
+            await asyncio.to_thread(
+                scraper.guards.failure_ledger.record, station_id, year, month, error
+            )
+        return year, month, None
+
+    async def fetch_month(self, year, month, entry):
+        """
+        Make one attempt at downloading a month.
+
+        Parameters:
+        - entry (CacheEntry or None): The cached copy to revalidate, if any.
+
+        Returns:
+        - bytes: The page, from the server or from the cache on a 304.
+
+        Raises:
+        - HTTPError: If the server answered with anything but 200 or 304.
+        """
+        scraper = self.weather_scraper
+        url = scraper.build_url(year, month)
+        parts = urlsplit(url)
+        headers = scraper.page_cache.validators(entry) if scraper.page_cache else {}
+
+        await asyncio.sleep(scraper.guards.rate_limit_delay())
+        response = await self.pool.request(f"{parts.path}?{parts.query}", headers)
+
+        if response.status == 304 and entry is not None:
+            await asyncio.to_thread(
+                scraper.page_cache.revalidated, scraper.weather_station_id, year, month, entry
+            )
+            return entry.body
+        if response.status != 200:
+            raise HTTPError(url, response.status, "Unexpected response", None, None)
+
+        if scraper.page_cache is None:
+            return response.body
+        await asyncio.to_thread(
+            scraper.store_page,
+            year,
+            month,
+            response.body,
+            {
+                "ETag": response.headers.get("etag"),
+                "Last-Modified": response.headers.get("last-modified"),
+            },
+        )
+        return response.body
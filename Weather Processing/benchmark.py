@@ -0,0 +1,426 @@
+"""Scraper and startup benchmarks, run with: python benchmark.py {parse,scrape,startup} --help"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from async_scraper import ConnectionPool
+from replay_server import ReplayPages, ReplayServer, synthetic_page
+from scrape_weather import WeatherScraper
+from table_parser import parse_daily_table
+
+# What the main menu prints once it is waiting for input, see menu.Menu.
+STARTUP_PROMPT = b">: "
+
+# Only needed once a plot, trend or scrape is asked for, never before the main menu.
+STARTUP_DEFERRED = ("matplotlib", "numpy", "lxml", "tqdm")
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is reported as None there.
+    resource = None
+
+
+def load_pages(fixtures=None, count=120):
+    """
+    Load recorded pages from a folder, falling back to synthetic pages.
+
+    Parameters:
+    - fixtures (str or None): Folder of recorded daily_data_e.html pages (*.html).
+    - count (int): How many synthetic pages to build when no folder is given, one per
+    month from January, count // 12 years back, through this year.
+
+    Returns:
+    - list: The decoded pages.
+    """
+    if fixtures:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(fixtures, "*.html"))):
+            with open(path, encoding="utf-8") as page_file:
+                pages.append(page_file.read())
+        return pages
+    first_year = datetime.now().year - (count - 1) // 12
+    return [synthetic_page(first_year + index // 12, index % 12 + 1) for index in range(count)]
+
+
+def time_parser(parse, pages, repeat):
+    """Return the best time in seconds to parse every page, out of repeat runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            parse(page)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_parsers(pages, repeat=5):
+    """
+    Compare MyHTMLParser and the lxml table extractor on the same pages.
+
+    Parameters:
+    - pages (list): Decoded daily data pages.
+    - repeat (int): Timing runs per parser, the best run is reported.
+
+    Returns:
+    - dict: Pages per second for each parser, the speedup and any pages where the
+    two parsers disagreed.
+    """
+    scraper = WeatherScraper(cache_dir=None, parser="html")
+    mismatches = [
+        index
+        for index, page in enumerate(pages)
+        if scraper.parse_page(page) != parse_daily_table(page)
+    ]
+
+    html_seconds = time_parser(scraper.parse_page, pages, repeat)
+    lxml_seconds = time_parser(parse_daily_table, pages, repeat)
+    return {
+        "pages": len(pages),
+        "html_pages_per_sec": len(pages) / html_seconds,
+        "lxml_pages_per_sec": len(pages) / lxml_seconds,
+        "speedup": html_seconds / lxml_seconds,
+        "identical": not mismatches,
+        "mismatched_pages": mismatches,
+    }
+
+
+def percentile(samples, fraction):
+    """Return the nearest rank percentile of samples, None if there are none."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def peak_rss_mb():
+    """Return this processes peak resident memory in MB, None where it cant be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def time_requests(scraper, latencies):
+    """
+    Record how long every page request takes, for the engine the scraper uses.
+
+    Parameters:
+    - scraper (WeatherScraper): The scraper being benchmarked.
+    - latencies (list): Seconds per request are appended here, failed requests included.
+
+    Description:
+    - Wraps the per request download method, only call this in a throwaway benchmark
+    process since the asyncio engine is wrapped at the class level.
+    - The asyncio engine is timed once it holds a connection, so time spent queued for
+    one isnt counted, matching the thread engine.
+    """
+    lock = threading.Lock()
+
+    if scraper.settings.engine == "asyncio":
+        send = ConnectionPool.send
+
+        async def timed_send(pool, *args):
+            start = time.perf_counter()
+            try:
+                return await send(pool, *args)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+        ConnectionPool.send = timed_send
+        return
+
+    fetch_page = scraper.fetch_page
+
+    def timed_fetch_page(*args):
+        start = time.perf_counter()
+        try:
+            return fetch_page(*args)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    scraper.fetch_page = timed_fetch_page
+
+
+def scrape_run(base_url, pages, start_year, settings):
+    """
+    Scrape every month from start_year on against the replay server, in a fresh process.
+
+    Parameters:
+    - base_url (str): The replay servers url.
+    - pages (list): The pages being replayed, used to time the parser on its own.
+    - start_year (int): The first year scraped, scraping runs through the current year.
+    - settings (dict): The 'engine', 'concurrency' and 'parse_workers' to run with.
+
+    Returns:
+    - dict: The settings along with months/sec, request latency percentiles, parse time
+    and peak memory for the run.
+    """
+    scraper = WeatherScraper(base_url=base_url, cache_dir=None)
+    scraper.set_engine(settings["engine"], settings["concurrency"], settings["parse_workers"])
+    latencies = []
+    time_requests(scraper, latencies)
+
+    start = time.perf_counter()
+    weather = scraper.scrape_weather(start_year, 1)
+    seconds = time.perf_counter() - start
+    months = len(scraper.get_months(start_year, 1))
+
+    p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+    return {
+        **settings,
+        "months": months,
+        "days": len(weather),
+        "seconds": seconds,
+        "months_per_sec": months / seconds,
+        "requests": len(latencies),
+        "latency_p50_ms": None if p50 is None else p50 * 1000,
+        "latency_p99_ms": None if p99 is None else p99 * 1000,
+        "parse_ms_per_page": time_parser(scraper.parse_page, pages, 1) / len(pages) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def benchmark_scrape(pages, sweep, years=27, server_settings=None):
+    """
+    Run scrape_weather end to end against a local replay server for every setting in sweep.
+
+    Parameters:
+    - pages (list): Decoded daily data pages to replay, each for the month it reports on,
+    see ReplayPages.
+    - sweep (dict): Lists of 'engine', 'concurrency' and 'parse_workers' values, every
+    combination is run.
+    - years (int): Years scraped per run, ending with the current year.
+    - server_settings (dict or None): ReplayServer 'latency', 'jitter' and 'error_rate'.
+
+    Returns:
+    - dict: The server settings and one result per run, see scrape_run.
+
+    Description:
+    - Each run gets its own process so its peak memory is its own.
+    """
+    server_settings = server_settings or {}
+    start_year = datetime.now().year - years + 1
+    runs = []
+    with ReplayServer(ReplayPages(pages, (start_year, 1)), **server_settings) as server:
+        for engine, concurrency, parse_workers in itertools.product(
+            sweep["engine"], sweep["concurrency"], sweep["parse_workers"]
+        ):
+            settings = {
+                "engine": engine,
+                "concurrency": concurrency,
+                "parse_workers": parse_workers,
+            }
+            with ProcessPoolExecutor(max_workers=1) as run_process:
+                runs.append(
+                    run_process.submit(
+                        scrape_run, server.base_url, pages, start_year, settings
+                    ).result()
+                )
+    return {"years": years, "server": server_settings, "runs": runs}
+
+
+def parse_importtime(report):
+    """
+    Read the output of python -X importtime.
+
+    Returns:
+    - dict: Module name -> cumulative microseconds, for every imported module.
+    - list: (microseconds, name) of the top level imports, the slowest first.
+    """
+    modules = {}
+    top_level = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            # The header line.
+            continue
+        modules[name.strip()] = int(cumulative)
+        if not name[1:].startswith(" "):
+            top_level.append((int(cumulative), name.strip()))
+    return modules, sorted(top_level, reverse=True)
+
+
+def time_startup(script, timeout=60):
+    """
+    Start a program once and time how long it takes to show its first prompt.
+
+    Parameters:
+    - script (str): The program to start, with the same interpreter as this one.
+    - timeout (float): Seconds to wait for the prompt.
+
+    Returns:
+    - dict: 'seconds' to the prompt, None if it never appeared, 'import_ms' spent
+    importing, the 'slowest_imports' at the top level and the 'deferred' modules of
+    STARTUP_DEFERRED that were imported anyway.
+
+    Description:
+    - The program runs in an empty folder, so it starts the way a first run would and
+    leaves no database or log file behind.
+    """
+    with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryFile() as errors:
+        start = time.perf_counter()
+        with subprocess.Popen(
+            [sys.executable, "-X", "importtime", "-u", os.path.abspath(script)],
+            cwd=folder,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=errors,
+        ) as process:
+            timer = threading.Timer(timeout, process.kill)
+            timer.start()
+            output = b""
+            while not output.endswith(STARTUP_PROMPT):
+                character = process.stdout.read(1)
+                if not character:
+                    break
+                output += character
+            seconds = time.perf_counter() - start
+            timer.cancel()
+            process.kill()
+
+        errors.seek(0)
+        modules, top_level = parse_importtime(errors.read().decode("utf-8", "replace"))
+    return {
+        "seconds": seconds if output.endswith(STARTUP_PROMPT) else None,
+        "import_ms": sum(microseconds for microseconds, _ in top_level) / 1000,
+        "slowest_imports": [f"{name} {us / 1000:.1f}ms" for us, name in top_level[:5]],
+        "deferred": sorted(name for name in modules if name in STARTUP_DEFERRED),
+    }
+
+
+def benchmark_startup(script, runs=5, budget_ms=500):
+    """
+    Time the programs startup several times and check it against a budget.
+
+    Parameters:
+    - script (str): The program to start.
+    - runs (int): Times to start it, the first is usually slower from a cold disk cache.
+    - budget_ms (float): Milliseconds the median start may take to reach the first prompt.
+
+    Returns:
+    - dict: The 'median_ms' and 'worst_ms' to the prompt, the last runs
+    import details from time_startup, and 'within_budget', False if the median went
+    over budget, a start never reached the prompt or a deferred module was imported.
+    """
+    starts = [time_startup(script) for _ in range(runs)]
+    times = sorted(
+        start["seconds"] * 1000 for start in starts if start["seconds"] is not None
+    )
+    median = times[len(times) // 2] if times else None
+    return {
+        "runs": runs,
+        "budget_ms": budget_ms,
+        "median_ms": median,
+        "worst_ms": times[-1] if len(times) == runs else None,
+        **{key: value for key, value in starts[-1].items() if key != "seconds"},
+        "within_budget": len(times) == runs
+        and median <= budget_ms
+        and not any(start["deferred"] for start in starts),
+    }
+
+
+def comma_list(cast):
+    """Return an argparse type that splits a comma separated list."""
+    return lambda text: [cast(value) for value in text.split(",") if value]
+
+
+def print_results(results):
+    """Print a results dict one key per line."""
+    for key, value in results.items():
+        print(f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+def main(argv=None):
+    """Run the benchmark picked on the command line and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parse_command = commands.add_parser("parse", help="Page parsing throughput.")
+    parse_command.add_argument("--fixtures", help="Folder of recorded *.html pages.")
+    parse_command.add_argument("--pages", type=int, default=120)
+    parse_command.add_argument("--repeat", type=int, default=5)
+    parse_command.add_argument("--json", action="store_true", help="Print raw JSON.")
+
+    scrape_command = commands.add_parser(
+        "scrape", help="End to end scraping against a local replay server."
+    )
+    scrape_command.add_argument("--fixtures", help="Folder of recorded *.html pages.")
+    scrape_command.add_argument("--years", type=int, default=27)
+    scrape_command.add_argument(
+        "--engines", type=comma_list(str), default=list(WeatherScraper.ENGINES)
+    )
+    scrape_command.add_argument("--concurrency", type=comma_list(int), default=[4, 8, 16])
+    scrape_command.add_argument("--parse-workers", type=comma_list(int), default=[0])
+    scrape_command.add_argument("--latency", type=float, default=0.05, help="Seconds.")
+    scrape_command.add_argument("--jitter", type=float, default=0.02, help="Seconds.")
+    scrape_command.add_argument("--error-rate", type=float, default=0.0)
+    scrape_command.add_argument("--json", action="store_true", help="Print raw JSON.")
+
+    startup_command = commands.add_parser(
+        "startup", help="Time from launch to the main menu, with -X importtime."
+    )
+    startup_command.add_argument(
+        "--script",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "weather_processor.py"),
+    )
+    startup_command.add_argument("--runs", type=int, default=5)
+    startup_command.add_argument(
+        "--budget-ms", type=float, default=500, help="The median start must beat it."
+    )
+    startup_command.add_argument("--json", action="store_true", help="Print raw JSON.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "startup":
+        results = benchmark_startup(args.script, args.runs, args.budget_ms)
+        if args.json:
+            print(json.dumps(results))
+        else:
+            print_results(results)
+        return 0 if results["within_budget"] else 1
+
+    if args.command == "scrape":
+        results = benchmark_scrape(
+            load_pages(args.fixtures, args.years * 12),
+            {
+                "engine": args.engines,
+                "concurrency": args.concurrency,
+                "parse_workers": args.parse_workers,
+            },
+            args.years,
+            {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate},
+        )
+        if args.json:
+            print(json.dumps(results))
+        else:
+            for run in results["runs"]:
+                print_results(run)
+                print()
+        return 0
+
+    results = benchmark_parsers(load_pages(args.fixtures, args.pages), args.repeat)
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print_results(results)
+    return 0 if results["identical"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
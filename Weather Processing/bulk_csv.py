@@ -0,0 +1,167 @@
+"""Reads Environment Canada's bulk data CSV files instead of scraping the html tables."""
+
+import csv
+import glob
+import logging
+import os
+import re
+
+# Reading name -> (value column, flag column) in the daily bulk data files.
+DAILY_COLUMNS = {
+    "Max": ("Max Temp (°C)", "Max Temp Flag"),
+    "Min": ("Min Temp (°C)", "Min Temp Flag"),
+    "Mean": ("Mean Temp (°C)", "Mean Temp Flag"),
+}
+DATE_COLUMN = "Date/Time"
+# Names the station on every row. Climate IDs arent the StationIDs the site and database use.
+CLIMATE_ID_COLUMN = "Climate ID"
+
+# Station detail -> column, repeated on every row of a bulk data file.
+STATION_COLUMNS = {
+    "name": "Station Name",
+    "latitude": "Latitude (y)",
+    "longitude": "Longitude (x)",
+}
+# Bulk data files are named en_climate_daily_<province>_<climate id>_<year>_P1D.csv.
+FILE_PROVINCE = re.compile(r"climate_daily_([A-Z]{2})_", re.IGNORECASE)
+
+
+def find_csv_files(directory):
+    """
+    List the bulk data files in a folder.
+
+    Parameters:
+    - directory (str): Folder holding per station or per year *.csv downloads, searched
+    recursively.
+
+    Returns:
+    - list: The file paths, sorted so older years are loaded first.
+    """
+    return sorted(glob.glob(os.path.join(directory, "**", "*.csv"), recursive=True))
+
+
+def parse_bulk_csv(path, climate_id=None):
+    """
+    Read the daily temperatures from one bulk data CSV file.
+
+    Parameters:
+    - path (str): A daily (timeframe=2) bulk data file.
+    - climate_id (str or None): The Climate ID the file must be recorded under, see
+    read_climate_id. Any file is read if None.
+
+    Returns:
+    - dict: Weather data keyed by 'YYYY-MM-DD', shaped like WeatherScraper.parse_page output.
+    A day with flagged readings also has 'Flags', reading name -> flag.
+    Empty if the file isnt a daily bulk data file or is from another station.
+
+    Description:
+    - Rows are read one at a time, the file is never held in memory whole.
+    - A blank reading, or one flagged 'M', is stored as 'M' like the html tables show it.
+    - Any other flag, like 'E' for estimated, is kept for the weather quality bits.
+    - Days with no readings or flags at all, like the rest of the current year, are skipped.
+    - Runs in the ingest process pool, so it only touches the file it was given.
+    """
+    weather = {}
+    try:
+        # The bulk endpoint writes a byte order mark ahead of the header.
+        with open(path, encoding="utf-8-sig", newline="") as csv_file:
+            reader = csv.DictReader(csv_file)
+            if DATE_COLUMN not in (reader.fieldnames or ()):
+                logging.warning("Skipping %s, it isnt a daily bulk data file.", path)
+                return weather
+
+            for row in reader:
+                if climate_id is not None and (
+                    (row.get(CLIMATE_ID_COLUMN) or "").strip() != climate_id
+                ):
+                    logging.warning(
+                        "Skipping %s, it has climate id %s rather than %s.",
+                        path,
+                        row.get(CLIMATE_ID_COLUMN),
+                        climate_id,
+                    )
+                    return {}
+
+                readings = {}
+                flags = {}
+                reported = False
+                for name, (value_column, flag_column) in DAILY_COLUMNS.items():
+                    value = (row.get(value_column) or "").strip()
+                    flag = (row.get(flag_column) or "").strip()
+                    reported = reported or bool(value or flag)
+                    readings[name] = value or "M"
+                    if value and flag and flag != "M":
+                        flags[name] = flag
+
+                if flags:
+                    readings["Flags"] = flags
+
+                if reported:
+                    weather[row[DATE_COLUMN]] = readings
+    except (OSError, UnicodeDecodeError, csv.Error) as error:
+        logging.warning("Couldnt read bulk data file %s: %s", path, error)
+    return weather
+
+
+def split_months(weather):
+    """
+    Group a files days by the month they fall in.
+
+    Parameters:
+    - weather (dict): Days keyed by 'YYYY-MM-DD', like parse_bulk_csv returns.
+
+    Returns:
+    - dict: (year, month) -> that months days, keyed and shaped as in weather.
+    """
+    months = {}
+    for sample_date, readings in weather.items():
+        month_key = (int(sample_date[:4]), int(sample_date[5:7]))
+        months.setdefault(month_key, {})[sample_date] = readings
+    return months
+
+
+def read_station_details(path):
+    """
+    Read the station a bulk data CSV file was recorded at.
+
+    Parameters:
+    - path (str): A daily bulk data file.
+
+    Returns:
+    - dict: Whichever of 'name', 'latitude', 'longitude' and 'province' the file gives,
+    shaped for DBOperations.save_station. Empty if the file couldnt be read.
+    """
+    details = {}
+    match = FILE_PROVINCE.search(os.path.basename(path))
+    if match:
+        details["province"] = match.group(1).upper()
+
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as csv_file:
+            row = next(csv.DictReader(csv_file), None) or {}
+        for detail, column in STATION_COLUMNS.items():
+            value = (row.get(column) or "").strip()
+            if value:
+                details[detail] = value if detail == "name" else float(value)
+    except (OSError, UnicodeDecodeError, csv.Error, ValueError) as error:
+        logging.warning("Couldnt read the station from %s: %s", path, error)
+    return details
+
+
+def read_climate_id(path):
+    """
+    Read the Climate ID a bulk data CSV file was recorded under.
+
+    Parameters:
+    - path (str): A daily bulk data file.
+
+    Returns:
+    - str or None: The files Climate ID, None if the file couldnt be read or doesnt name one.
+    """
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as csv_file:
+            row = next(csv.DictReader(csv_file), None) or {}
+    except (OSError, UnicodeDecodeError, csv.Error) as error:
+        logging.warning("Couldnt read the climate id from %s: %s", path, error)
+        return None
+    return (row.get(CLIMATE_ID_COLUMN) or "").strip() or None
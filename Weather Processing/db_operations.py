@@ -4,12 +4,143 @@
 # Cole Cianflone also created our documentation
 import sqlite3
 import logging
+import datetime
+import math
+import threading
 from dbcm import DBCM
+from failed_months import FailedMonthsMixin
+from month_coverage import CoverageMixin
+from query_cache import QueryCache
+from stations import StationsMixin
 
 
-class DBOperations:
+class DBOperations(CoverageMixin, FailedMonthsMixin, StationsMixin):
     """The DB operations class."""
 
+    # Weather column -> the reading it holds.
+    READING_COLUMNS = {"min_temp": "Min", "max_temp": "Max", "avg_temp": "Mean"}
+
+    # Bits of weather.quality, each reading has two shifted by QUALITY_SHIFTS: its value
+    # was missing, so the column is null, or it carried a legend flag like estimated.
+    QUALITY_MISSING = 1
+    QUALITY_FLAGGED = 2
+    QUALITY_SHIFTS = {"Min": 0, "Max": 2, "Mean": 4}
+
+    # Every weather row saved before stations were tracked came from here.
+    DEFAULT_STATION = "27174"
+
+    # Databases whose schema this process has already brought up to date, see
+    # database_context.
+    schema_ready = set()
+    schema_lock = threading.Lock()
+
+    # Schema changes applied on top of the tables made in initialize_db, in order.
+    # PRAGMA user_version records how many have run, so each runs once per database.
+    MIGRATIONS = (
+        # 1: A real uniqueness constraint for the save_data upsert, keeping the newest
+        # copy of any day saved twice.
+        (
+            """DELETE FROM weather WHERE id NOT IN (
+            SELECT MAX(id) FROM weather GROUP BY location, sample_date
+            )""",
+            """CREATE UNIQUE INDEX IF NOT EXISTS idx_location_sample_date
+            ON weather (location, sample_date)""",
+        ),
+        # 2: Integer date parts so plot queries are index range scans. They are virtual
+        # columns computed from sample_date, so existing rows need no rewrite.
+        (
+            """ALTER TABLE weather ADD COLUMN year INTEGER
+            GENERATED ALWAYS AS (CAST(substr(sample_date, 1, 4) AS INTEGER)) VIRTUAL""",
+            """ALTER TABLE weather ADD COLUMN month INTEGER
+            GENERATED ALWAYS AS (CAST(substr(sample_date, 6, 2) AS INTEGER)) VIRTUAL""",
+            """ALTER TABLE weather ADD COLUMN day INTEGER
+            GENERATED ALWAYS AS (CAST(substr(sample_date, 9, 2) AS INTEGER)) VIRTUAL""",
+            "CREATE INDEX IF NOT EXISTS idx_year_month_day ON weather (year, month, day)",
+        ),
+        # 3: Stations are first class. Weather rows point at their station and every
+        # index leads with it, so one station is one range scan.
+        (
+            """CREATE TABLE stations_v3 (
+            station_id TEXT PRIMARY KEY NOT NULL,
+            name TEXT,
+            province TEXT,
+            latitude REAL,
+            longitude REAL,
+            first_year INTEGER,
+            first_month INTEGER,
+            first_date TEXT,
+            last_date TEXT,
+            updated TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )""",
+            """INSERT INTO stations_v3 (station_id, first_year, first_month, updated)
+            SELECT station_id, first_year, first_month, updated FROM stations""",
+            "DROP TABLE stations",
+            "ALTER TABLE stations_v3 RENAME TO stations",
+            f"""INSERT INTO stations (station_id, name, province)
+            SELECT DISTINCT '{DEFAULT_STATION}', 'Winnipeg', 'MB' FROM weather WHERE true
+            ON CONFLICT (station_id) DO UPDATE SET
+            name = excluded.name, province = excluded.province""",
+            "ALTER TABLE weather ADD COLUMN station_id TEXT REFERENCES stations (station_id)",
+            f"UPDATE weather SET station_id = '{DEFAULT_STATION}'",
+            """UPDATE stations SET
+            first_date = (SELECT MIN(sample_date) FROM weather),
+            last_date = (SELECT MAX(sample_date) FROM weather)
+            WHERE station_id IN (SELECT station_id FROM weather)""",
+            "DROP INDEX IF EXISTS idx_location_sample_date",
+            "DROP INDEX IF EXISTS idx_sample_date",
+            "DROP INDEX IF EXISTS idx_year_month_day",
+            """CREATE UNIQUE INDEX IF NOT EXISTS idx_station_sample_date
+            ON weather (station_id, sample_date)""",
+            """CREATE INDEX IF NOT EXISTS idx_station_year_month_day
+            ON weather (station_id, year, month, day)""",
+        ),
+        # 4: Missing readings are null rather than 'M' text in REAL columns, with a
+        # quality bitfield recording what was missing or flagged. SQLite cant drop
+        # NOT NULL in place, so the table is rebuilt with the same ids.
+        (
+            """CREATE TABLE weather_v4 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+            sample_date TEXT NOT NULL,
+            location TEXT NOT NULL,
+            min_temp REAL,
+            max_temp REAL,
+            avg_temp REAL,
+            station_id TEXT REFERENCES stations (station_id),
+            quality INTEGER NOT NULL DEFAULT 0,
+            year INTEGER
+            GENERATED ALWAYS AS (CAST(substr(sample_date, 1, 4) AS INTEGER)) VIRTUAL,
+            month INTEGER
+            GENERATED ALWAYS AS (CAST(substr(sample_date, 6, 2) AS INTEGER)) VIRTUAL,
+            day INTEGER
+            GENERATED ALWAYS AS (CAST(substr(sample_date, 9, 2) AS INTEGER)) VIRTUAL
+            )""",
+            "INSERT INTO weather_v4 "
+            "(id, sample_date, location, min_temp, max_temp, avg_temp, station_id, quality) "
+            "SELECT id, sample_date, location, "
+            + ", ".join(
+                f"CASE WHEN typeof({column}) IN ('integer', 'real') THEN {column} END"
+                for column in READING_COLUMNS
+            )
+            + ", station_id, "
+            + " | ".join(
+                f"((typeof({column}) NOT IN ('integer', 'real')) << {shift})"
+                for column, shift in zip(
+                    READING_COLUMNS, map(QUALITY_SHIFTS.get, READING_COLUMNS.values())
+                )
+            )
+            + " FROM weather",
+            "DROP TABLE weather",
+            "ALTER TABLE weather_v4 RENAME TO weather",
+            """CREATE UNIQUE INDEX IF NOT EXISTS idx_station_sample_date
+            ON weather (station_id, sample_date)""",
+            """CREATE INDEX IF NOT EXISTS idx_station_year_month_day
+            ON weather (station_id, year, month, day)""",
+            # Only the few days with a missing or flagged reading are indexed.
+            """CREATE INDEX IF NOT EXISTS idx_station_quality
+            ON weather (station_id, sample_date, quality) WHERE quality != 0""",
+        ),
+    )
+
     # Tadgh Henry
     def __init__(self):
         """
@@ -17,11 +148,12 @@ class DBOperations:
 
         Description:
         - Sets up the context manager for the database connection by initializing
-        the necessary attributes.
+        the necessary attributes, nothing is opened until the first query.
         - The 'db_name' attribute is set to 'weather_data.sqlite'.
-        - Creates a 'database_context' attribute using the DBCM class with the provided
-        database name.
+        - Creates a 'connection_manager' attribute using the DBCM class with the provided
+        database name, queries use it through database_context.
         - Initializes 'conn' and 'cursor' attributes to None.
+        - 'query_cache' is shared with every other DBOperations on the same database.
 
         Raises:
         - sqlite3.DatabaseError: If there are issues with initializing the database
@@ -30,13 +162,30 @@ class DBOperations:
         logging.info("\n\nCreated DB Operations, looking for weather_data.sqlite")
         try:
             self.db_name = "weather_data.sqlite"
-            self.database_context = DBCM(self.db_name)
+            self.connection_manager = DBCM(self.db_name)
+            self.query_cache = QueryCache.for_database(self.db_name)
             self.conn = None
             self.cursor = None
         except sqlite3.DatabaseError as error:
             logging.critical("Error with SQLite3 python module: %e\n\n", error)
         logging.info("\n\nCreated DB Operations!")
 
+    @property
+    def database_context(self):
+        """
+        The DBCM queries run through, the first use in a process runs initialize_db.
+
+        Description:
+        - Setting up the schema waits for the first query instead of happening at
+        startup, later uses only check schema_ready.
+        """
+        if self.db_name not in self.schema_ready:
+            with self.schema_lock:
+                if self.db_name not in self.schema_ready:
+                    self.initialize_db()
+                    self.schema_ready.add(self.db_name)
+        return self.connection_manager
+
     # Tadgh Henry
     def initialize_db(self):
         """
@@ -50,13 +199,17 @@ class DBOperations:
         - Establishes a connection to the database and creates the 'weather' table
         if it doesn't already exist.
         - The 'weather' table includes columns for id, sample_date, location, min_temp,
-        max_temp, and avg_temp. The 'sample_date' column is indexed for faster access.
+        max_temp, and avg_temp, MIGRATIONS adds its station_id and indexes.
+        - The 'failed_months' table is the ledger of months that couldnt be downloaded.
+        - The 'coverage' table records every (station, year, month) that has been saved,
+        and the 'stations' table holds each stations name, place, first available month
+        and saved date range.
         - If the table creation or index creation fails due to an OperationalError,
         it prints an error message indicating the failure to initialize the database.
         """
         logging.info("\n\nTrying to initalize database.")
         try:
-            with self.database_context as cursor:
+            with self.connection_manager as cursor:
                 cursor.execute(
                     """CREATE TABLE IF NOT EXISTS weather (
                     id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
@@ -68,16 +221,62 @@ class DBOperations:
                     )"""
                 )
 
-                logging.info("Creating sample_date index.")
+                # Months that still failed after every retry, see retry.FailedMonthLedger.
+                cursor.execute(
+                    """CREATE TABLE IF NOT EXISTS failed_months (
+                    station_id TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    month INTEGER NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 1,
+                    last_error TEXT,
+                    last_attempt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (station_id, year, month)
+                    )"""
+                )
 
-                # Make index on sample_date for faster access
+                # Which months are saved, and whether they can still change, see gap_fill.
                 cursor.execute(
-                    "CREATE INDEX IF NOT EXISTS idx_sample_date ON weather (sample_date)"
+                    """CREATE TABLE IF NOT EXISTS coverage (
+                    station_id TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    month INTEGER NOT NULL,
+                    days INTEGER NOT NULL,
+                    complete INTEGER NOT NULL DEFAULT 0,
+                    fetched TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (station_id, year, month)
+                    )"""
                 )
 
+                cursor.execute(
+                    """CREATE TABLE IF NOT EXISTS stations (
+                    station_id TEXT PRIMARY KEY NOT NULL,
+                    first_year INTEGER NOT NULL,
+                    first_month INTEGER NOT NULL,
+                    updated TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )"""
+                )
+
+                self.migrate(cursor)
+
         except sqlite3.OperationalError as error:
             logging.warning("Database Initalization Operational Error: %e", error)
 
+    def migrate(self, cursor):
+        """
+        Bring the schema up to date by running any MIGRATIONS this database hasnt had yet.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): Cursor inside the initialize_db transaction, so a failed
+        migration rolls back along with its user_version bump.
+        """
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+        for number, statements in enumerate(self.MIGRATIONS[version:], start=version + 1):
+            logging.info("Migrating database to schema version %s.", number)
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(f"PRAGMA user_version = {number}")
+
     # Tadgh Henry
 
     # this function can be passed any query, but validate the query before-hand.
@@ -124,71 +323,118 @@ class DBOperations:
         logging.info("Get query returning none.")
         return None
 
-    # Cole Cianflone
-    # this function is used for the box plot
-    def fetch_monthly_averages(self, start_year=None, end_year=None):
+    def get_cached_query_data(self, sql_query, columns=None, size_hint=1024):
         """
-        Fetches minimum, mean, and maximum averages for each month within the specified
-        range of years.
+        Performs an SQL Query through the query cache.
 
         Parameters:
-        - start_year (str or None): The starting year for fetching data. If None, the query
-        fetches from the earliest available year.
-        - end_year (str or None): The ending year for fetching data. If None, the query
-        fetches up to the latest available year.
+        - sql_query (str): SQL Query to execute in the database, validated before-hand.
+        - columns (tuple or None): Return NumPy columns, see get_query_columns.
+        - size_hint (int): Passed on to get_query_columns.
 
         Returns:
-        - list or None: A list of tuples containing monthly average data (min, mean, max)
-        within the specified year range.
-        Returns None if an error occurs or no data is found.
+        - list, dict or None: As get_query_data, or get_query_columns when columns are given.
 
-        Raises:
-        - ValueError: If start_year or end_year are not valid digits.
+        Description:
+        - Repeat queries are answered without touching SQLite until save_data or
+        purge_data changes the data.
+        - Commits by another process, like a batch render or a second instance, are
+        caught by PRAGMA data_version, which drops the cache the same way.
+        """
+        try:
+            changed = self.database_context.data_changed()
+        except sqlite3.Error as error:
+            logging.warning("Couldnt read the data version, dropping the cache: %s", error)
+            changed = True
+        if changed:
+            self.query_cache.bump()
+
+        key = self.query_cache.make_key(sql_query, columns)
+        result = self.query_cache.get(key)
+        if result is not None:
+            return result
+
+        # Read before querying, so a write racing the query keeps its result out of the cache.
+        generation = self.query_cache.generation
+        if columns:
+            result = self.get_query_columns(sql_query, columns, size_hint)
+        else:
+            result = self.get_query_data(sql_query)
+        if result is not None:
+            self.query_cache.put(key, generation, result)
+        return result
+
+    def get_query_columns(self, sql_query, columns, size_hint=1024, chunk_rows=4096):
+        """
+        Performs an SQL Query and streams the result into one NumPy array per column.
+
+        Parameters:
+        - sql_query (str): SQL Query to execute in the database, validated before-hand.
+        - columns (sequence): A (name, kind) pair per selected column, kind being "date"
+        for 'YYYY-MM-DD' text or "float" for readings.
+        - size_hint (int): Rows the arrays start out with room for, they double when full.
+        - chunk_rows (int): Rows pulled from SQLite per fetchmany call.
+
+        Returns:
+        - dict or None: Column name -> array, dates as datetime64[D] and readings as float64
+        with NaN for missing (null) values. None if an error occurs.
 
         Description:
-        - Constructs an SQL query to calculate monthly averages for minimum, mean, and maximum
-        temperatures.
-        - Filters the data based on the provided start_year and end_year, excluding records with
-        missing or invalid temperature values ('M' or null).
-        - Groups the calculated averages by month and orders the results by month.
-        - Calls the 'get_query_data' method to execute the constructed SQL query and fetch the data
-          from the database.
+        - Rows are copied into preallocated arrays a chunk at a time, the full result is
+        never held as a list of tuples.
         """
-        logging.info("Get box plot data.")
+        # Imported here so only reading columns pays for loading NumPy.
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        dtypes = [
+            np.dtype("datetime64[D]") if kind == "date" else np.dtype(np.float64)
+            for _, kind in columns
+        ]
+        arrays = [np.empty(max(1, size_hint), dtype=dtype) for dtype in dtypes]
+        filled = 0
+        try:
+            with self.database_context as cursor:
+                cursor.execute(sql_query)
+                while chunk := cursor.fetchmany(chunk_rows):
+                    if filled + len(chunk) > len(arrays[0]):
+                        arrays = self.grow_columns(arrays, filled + len(chunk))
+
+                    for array, dtype, values in zip(arrays, dtypes, zip(*chunk)):
+                        array[filled : filled + len(chunk)] = self.column_values(values, dtype)
+                    filled += len(chunk)
+        except (sqlite3.OperationalError, ValueError) as error:
+            logging.warning("get_query_columns failed: %s", error)
+            return None
+
+        return {name: array[:filled] for (name, _), array in zip(columns, arrays)}
+
+    @staticmethod
+    def grow_columns(arrays, rows):
+        """Resize column arrays to hold at least rows, at least doubling them."""
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        capacity = max(2 * len(arrays[0]), rows)
+        return [np.resize(array, capacity) for array in arrays]
+
+    @staticmethod
+    def column_values(values, dtype):
+        """Convert one chunk of a column, anything that isnt a number becomes NaN."""
+        import numpy as np  # pylint: disable=import-outside-toplevel
 
         try:
-            if start_year.isdigit() and end_year.isdigit():
-                sql_query = (
-                    """SELECT strftime('%m', sample_date) AS month,
-                    AVG(min_temp) AS avg_min_temp,
-                    AVG(max_temp) AS avg_max_temp,
-                    AVG(avg_temp) AS avg_mean_temp
-                    FROM weather """
-                    f"WHERE strftime('%Y', sample_date) BETWEEN '{start_year}' AND '{end_year}' "
-                    """AND NOT (
-                    (min_temp LIKE '%M%' OR min_temp IS null)
-                    AND (max_temp LIKE '%M%' OR max_temp IS null)
-                    AND (avg_temp LIKE '%M%' OR avg_temp IS null)
-                    )
-                    GROUP BY month
-                    ORDER BY month """
-                )
-            else:
-                raise ValueError("start_year and end_year must both be digits.")
-            logging.info("Returning box plot data.")
-            return self.get_query_data(sql_query)
-        except ValueError as value_error:
-            logging.warning(
-                "Failed getting the box plot data, {start_year} and {end_year} ValueError: %e",
-                value_error,
+            return np.asarray(values, dtype=dtype)
+        except ValueError:
+            # Text left by databases saved before readings were normalized.
+            return np.array(
+                [value if isinstance(value, (int, float)) else np.nan for value in values],
+                dtype=dtype,
             )
 
-        logging.info("Returning empty box plot data.")
-        return None
-
     # Tadgh Henry
     # this function is used for the line chart
-    def fetch_year_month_average(self, year=None, month=None):
+    def fetch_year_month_average(
+        self, year=None, month=None, as_columns=False, station_id=DEFAULT_STATION
+    ):
         """
         Fetches minimum, mean, and maximum averages for the specified year and month from the
         database.
@@ -198,19 +444,22 @@ class DBOperations:
           is considered.
         - month (str or None): The month for which data is to be fetched. If None, data for all
         months is considered.
+        - as_columns (bool): Return NumPy columns, see get_query_columns.
+        - station_id (str or int): The station whose days are fetched.
 
         Returns:
         - list or None: A list of tuples containing daily average data for the specified year and
-        month.
+        month. With as_columns, a dict of 'day' and 'mean' arrays instead.
         Returns None if an error occurs or no data is found.
 
         Raises:
-        - ValueError: If year or month are not valid digits.
+        - ValueError: If year, month or station_id are not valid digits.
 
         Description:
         - Constructs an SQL query to calculate daily average temperatures for the specified year
         and month.
         - Filters the data based on the provided year and month.
+        - Missing readings are null, a day without a mean shows as a gap.
         - Groups the calculated averages by day and orders the results by day.
         - Calls the 'get_query_data' method to execute the constructed SQL query and fetch the data
           from the database.
@@ -218,21 +467,25 @@ class DBOperations:
         logging.info("Get line plot data.")
 
         try:
-            if year.isdigit() and month.isdigit():
+            if year.isdigit() and month.isdigit() and str(station_id).isdigit():
                 sql_query = (
-                    "SELECT strftime('%Y-%m-%d', sample_date) AS day,  "
+                    "SELECT sample_date, "
                     "AVG(avg_temp) AS mean_daily_temp "
                     "FROM weather "
-                    f"WHERE strftime('%Y', sample_date) = '{year}' "
-                    f"AND strftime('%m', sample_date) = '{month}' "
+                    f"WHERE station_id = '{station_id}' "
+                    f"AND year = {int(year)} AND month = {int(month)} "
                     "GROUP BY day "
                     "ORDER BY day; "
                 )
             else:
-                raise ValueError("year and month must both be digits.")
+                raise ValueError("year, month and station_id must be digits.")
 
             logging.info("Returning line plot data.")
-            return self.get_query_data(sql_query)
+            if as_columns:
+                return self.get_cached_query_data(
+                    sql_query, (("day", "date"), ("mean", "float")), size_hint=31
+                )
+            return self.get_cached_query_data(sql_query)
         except ValueError as value_error:
             logging.warning(
                 "Failed getting the line plot data, {year} and {month} ValueError: %e",
@@ -242,11 +495,55 @@ class DBOperations:
         logging.info("Returning empty line plot data.")
         return None
 
+    def fetch_daily_columns(self, station_id=DEFAULT_STATION, start_date=None, end_date=None):
+        """
+        Fetch a stations daily readings as NumPy columns, in one query.
+
+        Parameters:
+        - station_id (str or int): The station to fetch.
+        - start_date (str, datetime.date or None): First day, 'YYYY-MM-DD', from the start
+        of the record if None.
+        - end_date (str, datetime.date or None): Last day, to the end of the record if None.
+
+        Returns:
+        - dict or None: 'day' (datetime64[D]), 'min', 'max' and 'mean' arrays in date order,
+        missing readings are NaN. None if an error occurs.
+
+        Raises:
+        - ValueError: If station_id isnt digits or a date isnt a valid date.
+
+        Description:
+        - Reads one range of the (station_id, sample_date) index, the base the trend and
+        smoothing analysis work from.
+        """
+        if not str(station_id).isdigit():
+            raise ValueError("station_id must be digits.")
+
+        sql_query = (
+            "SELECT sample_date, min_temp, max_temp, avg_temp FROM weather "
+            f"WHERE station_id = '{station_id}'"
+        )
+        if start_date is not None:
+            start_date = datetime.date.fromisoformat(str(start_date)).isoformat()
+            sql_query += f" AND sample_date >= '{start_date}'"
+        if end_date is not None:
+            end_date = datetime.date.fromisoformat(str(end_date)).isoformat()
+            sql_query += f" AND sample_date <= '{end_date}'"
+
+        return self.get_cached_query_data(
+            sql_query + " ORDER BY sample_date",
+            (("day", "date"), ("min", "float"), ("max", "float"), ("mean", "float")),
+            size_hint=366 * 32,
+        )
+
     # Tadgh Henry
-    def get_earliest_date(self):
+    def get_earliest_date(self, station_id=DEFAULT_STATION):
         """
         Retrieves the earliest date available in the dataset.
 
+        Parameters:
+        - station_id (str or int): The station to look at.
+
         Returns:
         - list or None: A list containing the earliest year and month found in the dataset
         formatted as ['year', 'month']. Returns None if there is no data.
@@ -257,11 +554,14 @@ class DBOperations:
         the data from the database.
         - Parses the retrieved date string to extract the earliest year and month if available.
         """
+        if not str(station_id).isdigit():
+            raise ValueError("station_id must be digits.")
 
-        earliest_date_query = """SELECT MIN(strftime('%Y-%m', sample_date)) AS
-        earliest_year FROM weather"""
+        # The MIN is one seek on the (station_id, sample_date) index, not a scan.
+        earliest_date_query = f"""SELECT strftime('%Y-%m', (SELECT MIN(sample_date)
+        FROM weather WHERE station_id = '{station_id}')) AS earliest_year"""
 
-        earliest_year = self.get_query_data(earliest_date_query)[0][0]
+        earliest_year = self.get_cached_query_data(earliest_date_query)[0][0]
         if earliest_year is None:
             logging.info("Earliest year was None.")
             return None
@@ -271,27 +571,36 @@ class DBOperations:
         return None
 
     # Tadgh Henry
-    def get_year_ends(self):
+    def get_year_ends(self, station_id=DEFAULT_STATION):
         """
         Retrieves information about the newest and oldest data points in the dataset.
 
+        Parameters:
+        - station_id (str or int): The station to look at.
+
         Returns:
         - tuple or None: A tuple containing information about the newest and oldest data points.
         If no data is available, returns None.
 
         Description:
-        - Checks for the availability of new data and the earliest date in the dataset using
-        the 'get_latest_date' and 'get_earliest_date' methods.
+        - Reads the oldest and newest year in one query rather than asking
+        'get_earliest_date' and 'get_latest_date' separately.
         - If both new data and the earliest date are available, it returns a tuple
         containing the newest and oldest data points.
         - If either new data or the earliest date is not available, it returns None.
         """
         try:
             logging.info("Making sure year ranges arent None.")
-            newest_year = self.get_latest_date()
-            oldest_year = self.get_earliest_date()
-            if oldest_year is not None and newest_year is not None:
-                return (oldest_year[0], newest_year[0])
+            if not str(station_id).isdigit():
+                raise ValueError("station_id must be digits.")
+            year_ends = self.get_cached_query_data(
+                "SELECT strftime('%Y', (SELECT MIN(sample_date) FROM weather "
+                f"WHERE station_id = '{station_id}')), "
+                "strftime('%Y', (SELECT MAX(sample_date) FROM weather "
+                f"WHERE station_id = '{station_id}'))"
+            )
+            if year_ends and None not in year_ends[0]:
+                return year_ends[0]
 
         except ValueError as error:
             logging.warning(
@@ -303,10 +612,13 @@ class DBOperations:
         return None
 
     # Tadgh Henry
-    def get_latest_date(self):
+    def get_latest_date(self, station_id=DEFAULT_STATION):
         """
         Retrieves the most recent date available in the dataset.
 
+        Parameters:
+        - station_id (str or int): The station to look at.
+
         Returns:
         - list or None: A list containing the most recent year and month found in the dataset
         formatted as ['year', 'month']. Returns None if there is no data.
@@ -317,89 +629,286 @@ class DBOperations:
         the data from the database.
         - Parses the retrieved date string to extract the most recent year and month if available.
         """
+        if not str(station_id).isdigit():
+            raise ValueError("station_id must be digits.")
+
         recent_date_query = (
-            "SELECT MAX(strftime('%Y-%m', sample_date)) AS latest_date FROM weather"
+            "SELECT strftime('%Y-%m', (SELECT MAX(sample_date) FROM weather "
+            f"WHERE station_id = '{station_id}')) AS latest_date"
         )
-        last_date_available = self.get_query_data(recent_date_query)[0][0]
+        last_date_available = self.get_cached_query_data(recent_date_query)[0][0]
         if last_date_available is not None:
             return last_date_available.split("-")
 
         return None
 
     # Cole Cianflone, Fixed by Tadgh
-    def save_data(self, data_to_save):
+    def save_data(self, data_to_save, station_id=DEFAULT_STATION, coverage=None):
         """
-        Save new (non-duplicate) data to the database.
+        Save data to the database, replacing any days already saved.
 
         Saves new data to the 'weather' table in the database.
 
         Parameters:
-        - data_to_save (dict): A dictionary containing data to be saved.
+        - data_to_save (dict or iterable): A dictionary containing data to be saved.
         Keys are dates, and values are dictionaries with temperature information
-        (keys: 'Min', 'Max', 'Mean').
+        (keys: 'Min', 'Max', 'Mean', and optionally 'Flags' naming the flagged readings).
+        Any iterable or generator of (date, values) pairs works too, it is collected
+        and checked by validate_days before anything is written.
+        - station_id (str or int): The station the days were recorded at.
+        - coverage (list or None): (station_id, year, month, days) tuples recorded with
+        record_coverage in the same transaction, so months are only marked saved if
+        their days are.
+
+        Returns:
+        - bool: True once the days are committed, False if nothing was saved.
+
+        Raises:
+        - Anything other than the errors below, those are bugs rather than bad input.
 
         Description:
-        - Attempts to save new data to the 'weather' table in the database.
-        - Loops through the provided 'data_to_save' dictionary, extracting date and
-        temperature information.
-        - Inserts the extracted data into the 'weather' table if the sample_date
-        doesn't already exist,
-        using an 'INSERT OR IGNORE' SQL statement.
-        - If there's an OperationalError while saving the data, attempts to handle it
-        by initializing the database
-        and re-saving the data.
+        - Readings are normalized on the way in, see normalize_readings.
+        - Every row goes through one executemany upsert inside a single transaction.
+        - A day already saved for the station is overwritten, so revised values win.
+        - A station not seen before gets a stations row, its saved date range is
+        widened to cover the new days.
+        - Input that isnt (date, values) pairs is logged and nothing is saved.
+        - If there's an OperationalError while saving the data, the database is
+        initialized and the save is tried once more.
         - If there's an IntegrityError due to conflicts with existing data during insertion,
         prints an error message indicating an Integrity Error occurred with the save_data function.
         """
         try:
-            with self.database_context as cursor:
-                for date, data in data_to_save.items():
-                    min_temp = data.get("Min")
-                    max_temp = data.get("Max")
-                    avg_temp = data.get("Mean")
-                    location = "Winnipeg, MB"
+            days = self.validate_days(data_to_save)
+        except (TypeError, ValueError) as error:
+            logging.warning("Save data wasnt a dict or (date, values) pairs. %s", error)
+            return False
 
-                    cursor.execute(
-                        """INSERT OR IGNORE INTO weather (sample_date, location,
-                    min_temp, max_temp, avg_temp)
-                    SELECT ?, ?, ?, ?, ?
-                    WHERE NOT EXISTS (
-                    SELECT 1 FROM weather WHERE sample_date = ?
-                    )""",
-                        (date, location, min_temp, max_temp, avg_temp, date),
-                    )
-        except AttributeError:
-            logging.warning(
-                """Save data had no "items".""",
-            )
-        except sqlite3.OperationalError as error:
+        for attempt in range(2):
             try:
+                with self.database_context as cursor:
+                    self.save_days(cursor, station_id, days)
+                    if coverage:
+                        self.record_coverage(coverage, cursor)
+                # After the commit, so nothing read before it can be cached as current.
+                self.query_cache.bump()
+                return True
+            except sqlite3.OperationalError as error:
+                if attempt:
+                    logging.critical("Couldnt recover, couldnt save the data %s", error)
+                else:
+                    logging.warning(
+                        "save_data error, making sure the tables exist before retrying. %s",
+                        error,
+                    )
+                    self.initialize_db()
+            except sqlite3.IntegrityError as error:
                 logging.warning(
-                    """Error: save_data saving data, making sure table
-                    exists. Will try to re-save.  %e""",
-                    error,
+                    "save_data Integrity Error with the save_data function. %s", error
                 )
-                self.initialize_db()
-                self.save_data(data_to_save)
+                break
+        return False
 
-            except sqlite3.OperationalError as error_two:
-                logging.critical(
-                    """Couldnt recover, couldnt save the data %e""",
-                    error_two,
-                )
-        except sqlite3.IntegrityError as error:
-            logging.warning(
-                "save_data Integrity Error with the save_data function. %e", error
+    @staticmethod
+    def validate_days(data_to_save):
+        """
+        Collect the days to save, checking their shape before any are written.
+
+        Parameters:
+        - data_to_save (dict or iterable): Dates to readings, or (date, values) pairs.
+
+        Returns:
+        - list: The (date, values) pairs, safe to read more than once.
+
+        Raises:
+        - TypeError: If the input isnt pairs or a days values arent a dict.
+        - ValueError: If a date isnt in YYYY-MM-DD form.
+        """
+        if isinstance(data_to_save, dict):
+            data_to_save = data_to_save.items()
+        days = []
+        for day in data_to_save:
+            if not isinstance(day, tuple) or len(day) != 2:
+                raise TypeError(f"{day!r} isnt a (date, values) pair.")
+            date, data = day
+            if not isinstance(date, str) or len(date) != 10:
+                raise ValueError(f"{date!r} isnt a YYYY-MM-DD date.")
+            datetime.date.fromisoformat(date)
+            if not isinstance(data, dict):
+                raise TypeError(f"The values for {date} arent a dict.")
+            days.append(day)
+        return days
+
+    def save_days(self, cursor, station_id, days):
+        """
+        Upsert a stations days inside the callers transaction, the body of save_data.
+
+        Parameters:
+        - cursor (sqlite3.Cursor): Cursor of the open transaction.
+        - station_id (str or int): The station the days were recorded at.
+        - days (iterable): (date, values) pairs, see validate_days.
+        """
+        station_id = str(station_id)
+        # The oldest and newest day saved, for the stations date range.
+        span = {}
+
+        def rows():
+            for date, data in days:
+                span["first"] = min(span.get("first", date), date)
+                span["last"] = max(span.get("last", date), date)
+                yield (date, station_id, location, *self.normalize_readings(data))
+
+        cursor.execute(
+            "INSERT INTO stations (station_id) VALUES (?) ON CONFLICT DO NOTHING",
+            (station_id,),
+        )
+        # location is kept readable for older tools, the station does the work.
+        cursor.execute(
+            "SELECT COALESCE(name || ', ' || province, name, station_id) "
+            "FROM stations WHERE station_id = ?",
+            (station_id,),
+        )
+        location = cursor.fetchone()[0]
+        cursor.executemany(
+            """INSERT INTO weather
+            (sample_date, station_id, location, min_temp, max_temp, avg_temp, quality)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (station_id, sample_date) DO UPDATE SET
+            min_temp = excluded.min_temp,
+            max_temp = excluded.max_temp,
+            avg_temp = excluded.avg_temp,
+            quality = excluded.quality""",
+            rows(),
+        )
+        if span:
+            cursor.execute(
+                """UPDATE stations SET
+                first_date = MIN(COALESCE(first_date, ?2), ?2),
+                last_date = MAX(COALESCE(last_date, ?3), ?3)
+                WHERE station_id = ?1""",
+                (station_id, span["first"], span["last"]),
             )
 
+    def replace_months(self, station_id, months_weather):
+        """
+        Swap whole months of a stations data for freshly downloaded copies.
+
+        Parameters:
+        - station_id (str or int): The station the months belong to.
+        - months_weather (dict): (year, month) -> that months weather keyed by date.
+
+        Returns:
+        - bool: True once the months are replaced, False if nothing changed.
+
+        Description:
+        - Deleting the old days, saving the new ones, the stations date range and the
+        coverage all happen in one transaction, so a failure leaves the months exactly
+        as they were.
+        - Days the new copy no longer lists are gone afterwards, unlike save_data.
+        """
+        if not str(station_id).isdigit():
+            raise ValueError("station_id must be digits.")
+        station_id = str(station_id)
+        keys = [(station_id, int(year), int(month)) for year, month in months_weather]
+
+        try:
+            with self.database_context as cursor:
+                cursor.executemany(
+                    "DELETE FROM weather WHERE station_id = ? AND year = ? AND month = ?", keys
+                )
+                self.save_days(
+                    cursor,
+                    station_id,
+                    (day for weather in months_weather.values() for day in weather.items()),
+                )
+                cursor.execute(
+                    """UPDATE stations SET
+                    first_date = (SELECT MIN(sample_date) FROM weather WHERE station_id = ?1),
+                    last_date = (SELECT MAX(sample_date) FROM weather WHERE station_id = ?1)
+                    WHERE station_id = ?1""",
+                    (station_id,),
+                )
+                self.record_coverage(
+                    [
+                        (station_id, year, month, len(weather))
+                        for (year, month), weather in months_weather.items()
+                    ],
+                    cursor,
+                )
+            self.query_cache.bump()
+            return True
+        except (AttributeError, TypeError, ValueError, sqlite3.DatabaseError) as error:
+            logging.warning("Couldnt replace %s months of %s: %s", len(keys), station_id, error)
+        return False
+
+    @classmethod
+    def normalize_readings(cls, data):
+        """
+        Turn one days parsed readings into the values the weather table stores.
+
+        Parameters:
+        - data (dict): 'Min', 'Max' and 'Mean' as parsed, numbers or 'M' text, with an
+        optional 'Flags' collection of the readings that carried a legend flag.
+
+        Returns:
+        - tuple: (min, max, mean, quality), a reading that isnt a number is None and
+        marked QUALITY_MISSING in the quality bits.
+        """
+        flagged = data.get("Flags") or ()
+        values = []
+        quality = 0
+        for reading in cls.READING_COLUMNS.values():
+            try:
+                value = float(data.get(reading))
+            except (TypeError, ValueError):
+                value = None
+            if value is None or math.isnan(value):
+                value = None
+                quality |= cls.QUALITY_MISSING << cls.QUALITY_SHIFTS[reading]
+            if reading in flagged:
+                quality |= cls.QUALITY_FLAGGED << cls.QUALITY_SHIFTS[reading]
+            values.append(value)
+        return (*values, quality)
+
+    def get_quality_days(self, station_id, start_year=None, end_year=None):
+        """
+        List a stations days with a missing or flagged reading.
+
+        Parameters:
+        - station_id (str or int): The station to look at.
+        - start_year (str or None): Only days from this year on.
+        - end_year (str or None): Only days up to the end of this year.
+
+        Returns:
+        - list or None: (sample_date, quality) tuples, see QUALITY_SHIFTS for the bits.
+        None if the query failed.
+
+        Description:
+        - Answered from the partial quality index, clean days are never read.
+        """
+        if not str(station_id).isdigit():
+            raise ValueError("station_id must be digits.")
+
+        sql_query = (
+            "SELECT sample_date, quality FROM weather "
+            f"WHERE station_id = '{station_id}' AND quality != 0"
+        )
+        if start_year is not None:
+            sql_query += f" AND sample_date >= '{int(start_year):04d}'"
+        if end_year is not None:
+            sql_query += f" AND sample_date < '{int(end_year) + 1:04d}'"
+        return self.get_query_data(sql_query + " ORDER BY sample_date")
+
     # Tadgh
-    def purge_data(self, burn=False):
+    def purge_data(self, burn=False, station_id=None):
         """
         Remove all data from the 'weather' table, or drop all tables in the database.
 
         Parameters:
         - burn (bool): If True, drops all tables in the database.
                     If False (default), deletes data from the 'weather' table only.
+        - station_id (str or None): Only delete this stations data, the other stations
+        and the stations metadata are kept. Ignored when burning.
 
         Note:
         - Be cautious when using burn=True, as it will permanently delete all tables and their data.
@@ -408,25 +917,48 @@ class DBOperations:
         Usage:
         Example 1: obj.purge_data()  # Deletes data from the 'weather' table.
         Example 2: obj.purge_data(burn=True)  # Drops all tables in the database.
+        Example 3: obj.purge_data(station_id=27174)  # Deletes one stations data.
         """
+        if station_id is not None and not burn:
+            self.purge_station(station_id)
+            return
+
         try:
             with self.database_context as cursor:
                 cursor.execute("DELETE FROM weather")
+                cursor.execute("DELETE FROM failed_months")
+                cursor.execute("DELETE FROM coverage")
                 cursor.execute("DELETE FROM sqlite_sequence")
+                cursor.execute("UPDATE stations SET first_date = NULL, last_date = NULL")
 
                 logging.info("Data deleted from weather table.")
 
                 if burn is True:
-                    logging.info("Dropping any views, index's found in sqlite_master.")
+                    logging.info("Dropping any tables, views, index's found in sqlite_master.")
 
                     cursor.execute("SELECT name FROM sqlite_master WHERE type='view'")
                     views = cursor.fetchall()
                     for view in views:
                         cursor.execute(f"DROP VIEW IF EXISTS {view[0]}")
-                    cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+                    # Indexes backing a PRIMARY KEY have no sql and cant be dropped.
+                    cursor.execute(
+                        "SELECT name FROM sqlite_master WHERE type='index' AND sql IS NOT NULL"
+                    )
                     indexes = cursor.fetchall()
                     for index in indexes:
                         cursor.execute(f"DROP INDEX IF EXISTS {index[0]}")
+                    cursor.execute(
+                        "SELECT name FROM sqlite_master "
+                        "WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+                    )
+                    for table in cursor.fetchall():
+                        cursor.execute(f"DROP TABLE IF EXISTS {table[0]}")
+                    # initialize_db builds everything again from the first migration.
+                    cursor.execute("PRAGMA user_version = 0")
+            if burn is True:
+                # The next query sets the schema up again, see database_context.
+                self.schema_ready.discard(self.db_name)
+            self.query_cache.bump()
         except sqlite3.OperationalError as error:
             logging.critical(
                 "purge_data An error occurred while purging data. Burn state is %e.  %e",
@@ -1,12 +1,36 @@
 """Holds the database context manager class."""
 # Made by Tadgh
+import os
 import sqlite3
 import logging
+import threading
 
 
 class DBCM:
     """Class for enacting operations on SQLite database."""
 
+    # Applied once to every new connection.
+    PRAGMAS = (
+        # Readers dont block the writer and the writer doesnt block readers.
+        "PRAGMA journal_mode = WAL",
+        # Safe with WAL, only the last transactions can be lost on power failure.
+        "PRAGMA synchronous = NORMAL",
+        # Negative sizes are in KiB, 32 MB of page cache.
+        "PRAGMA cache_size = -32000",
+        "PRAGMA mmap_size = 268435456",
+        "PRAGMA temp_store = MEMORY",
+    )
+
+    # Prepared statements kept per connection, keyed by their sql text.
+    CACHED_STATEMENTS = 256
+
+    # Seconds a write waits on another threads write before giving up.
+    BUSY_TIMEOUT = 30
+
+    # Per thread {database name: open connection state}, shared by every DBCM so
+    # separate DBOperations objects reuse the same connection.
+    threads = threading.local()
+
     def __init__(self, database_name):
         """
         Initialize the DBCM instance with the given database name.
@@ -16,23 +40,98 @@ class DBCM:
         """
 
         self.db_name = database_name
-        self.conn = None
-        self.cursor = None
         logging.info("Created DB Content manager.")
 
+    @property
+    def state(self):
+        """This threads connection state for the database, opening the connection if needed."""
+        states = getattr(self.threads, "states", None)
+        # A forked worker process inherits the parents connections, SQLite connections
+        # cant cross a fork so the worker opens its own and leaves those untouched.
+        if states is None or self.threads.pid != os.getpid():
+            states = self.threads.states = {}
+            self.threads.pid = os.getpid()
+
+        state = states.get(self.db_name)
+        if state is None:
+            state = states[self.db_name] = {"conn": self.connect(), "cursors": []}
+        return state
+
+    @property
+    def conn(self):
+        """The connection this thread uses."""
+        return self.state["conn"]
+
+    @property
+    def cursor(self):
+        """The cursor of this threads innermost with block, None outside of one."""
+        cursors = self.state["cursors"]
+        return cursors[-1] if cursors else None
+
+    def connect(self):
+        """
+        Open and tune a connection for the current thread.
+
+        Returns:
+        - sqlite3.Connection: A connection in autocommit mode, transactions are begun
+        and ended by the with blocks.
+        """
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=self.BUSY_TIMEOUT,
+            isolation_level=None,
+            cached_statements=self.CACHED_STATEMENTS,
+        )
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        logging.info("Opened DB connection for %s.", threading.current_thread().name)
+        return conn
+
+    def data_changed(self):
+        """
+        Check whether another connection committed since this thread last checked.
+
+        Returns:
+        - bool: True if PRAGMA data_version moved, or this thread hasnt checked before.
+
+        Description:
+        - data_version only counts commits made by other connections, including other
+        threads and processes, never this connections own.
+        """
+        state = self.state
+        version = state["conn"].execute("PRAGMA data_version").fetchone()[0]
+        changed = state.get("data_version") != version
+        state["data_version"] = version
+        return changed
+
+    def close(self):
+        """Close the current threads connection, the next with block opens a new one."""
+        if getattr(self.threads, "pid", None) != os.getpid():
+            return
+        state = self.threads.states.pop(self.db_name, None)
+        if state is not None:
+            state["conn"].close()
+
     def __enter__(self):
         """
         Enter method for the context manager.
 
-        Establishes a connection to the SQLite database and returns a cursor.
+        Begins a transaction on this threads connection and returns a cursor.
 
         Returns:
         - sqlite3.Cursor: The cursor object associated with the database connection.
+
+        Description:
+        - A nested with block runs inside a savepoint of the outer blocks transaction,
+        so it can still be rolled back on its own.
         """
         try:
-            self.conn = sqlite3.connect(self.db_name)
-            self.cursor = self.conn.cursor()
-            return self.cursor
+            state = self.state
+            depth = len(state["cursors"])
+            state["conn"].execute(f"SAVEPOINT block_{depth}" if depth else "BEGIN")
+            cursor = state["conn"].cursor()
+            state["cursors"].append(cursor)
+            return cursor
         except sqlite3.Error as error:
             logging.critical("Error with SQLite3 runtime library: %e", error)
             raise
@@ -42,30 +141,39 @@ class DBCM:
         """
         Exit method for the context manager.
 
-        Cleans up by closing the cursor, committing any pending changes,
-        and then closing the connection to the database.
+        Cleans up by closing the cursor, then committing the transaction, or rolling
+        it back on an exception, once the outermost with block exits.
+        The connection stays open for the threads next with block, a commit that fails
+        is rolled back before it is raised so the next block can still begin.
 
         Parameters:
         - exc_type: Exception type.
         - exc_value: Exception value.
         - traceback: Traceback information."""
 
+        state = self.state
+        state["cursors"].pop().close()
+        depth = len(state["cursors"])
+        if depth:
+            if exc_type is not None:
+                state["conn"].execute(f"ROLLBACK TO block_{depth}")
+            state["conn"].execute(f"RELEASE block_{depth}")
+            return
+
         if exc_type is None:
             # No exception occurred, commit changes
-            if self.cursor:
-                self.cursor.close()
-                logging.info("Closed DB cursor.")
-            if self.conn:
-                self.conn.commit()
-                self.conn.close()
-                logging.info("Committed to DB and closed connection.")
+            try:
+                state["conn"].commit()
+            except sqlite3.Error as error:
+                # A failed COMMIT, like SQLITE_BUSY past the busy timeout, leaves the
+                # transaction open, so the next BEGIN on this connection would fail too.
+                state["conn"].rollback()
+                logging.critical("Commit failed, rolled back changes: %s", error)
+                raise
+            logging.info("Committed to DB.")
         else:
             # An exception occurred, roll back changes
-            if self.conn:
-                self.conn.rollback()
-                self.conn.close()
-                logging.warning(
-                    "Rolled back changes and closed connection due to exception."
-                )
+            state["conn"].rollback()
+            logging.warning("Rolled back changes due to exception.")
             # You may choose to log the exception details here as well
             logging.exception("Exception occurred: %s", exc_value)
@@ -0,0 +1,60 @@
+"""Database side of the failed month ledger, see retry.FailedMonthLedger."""
+
+import logging
+import sqlite3
+
+
+class FailedMonthsMixin:
+    """Reads and writes the failed_months table, mixed into DBOperations."""
+
+    def record_failed_month(self, station_id, year, month, error):
+        """
+        Add a month to the failed month ledger, or bump its attempt count.
+
+        Parameters:
+        - station_id (str): The station the month belongs to.
+        - year (int): The year that failed.
+        - month (int): The month that failed.
+        - error (Exception or str): Why it failed, kept for troubleshooting.
+        """
+        try:
+            with self.database_context as cursor:
+                cursor.execute(
+                    """INSERT INTO failed_months (station_id, year, month, last_error)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (station_id, year, month) DO UPDATE SET
+                    attempts = attempts + 1,
+                    last_error = excluded.last_error,
+                    last_attempt = CURRENT_TIMESTAMP""",
+                    (str(station_id), int(year), int(month), str(error)),
+                )
+        except sqlite3.OperationalError as error_op:
+            logging.warning("Couldnt record failed month %s-%s: %s", year, month, error_op)
+
+    def clear_failed_month(self, station_id, year, month):
+        """Remove a month from the failed month ledger once it has downloaded."""
+        try:
+            with self.database_context as cursor:
+                cursor.execute(
+                    "DELETE FROM failed_months WHERE station_id = ? AND year = ? AND month = ?",
+                    (str(station_id), int(year), int(month)),
+                )
+        except sqlite3.OperationalError as error:
+            logging.warning("Couldnt clear failed month %s-%s: %s", year, month, error)
+
+    def get_failed_months(self, station_id=None):
+        """
+        List the months in the failed month ledger.
+
+        Parameters:
+        - station_id (str or None): Only list this stations months.
+
+        Returns:
+        - list or None: (station_id, year, month) tuples, None if the query failed.
+        """
+        sql_query = "SELECT station_id, year, month FROM failed_months"
+        if station_id is not None:
+            if not str(station_id).isdigit():
+                raise ValueError("station_id must be digits.")
+            sql_query += f" WHERE station_id = '{station_id}'"
+        return self.get_query_data(sql_query + " ORDER BY station_id, year, month")
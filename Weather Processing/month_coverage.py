@@ -0,0 +1,104 @@
+"""Database side of the coverage table, which months are saved and which are final."""
+
+import datetime
+import logging
+import sqlite3
+from page_cache import PageCache
+
+
+class CoverageMixin:
+    """Reads and writes the coverage table, mixed into DBOperations."""
+
+    def record_coverage(self, months, cursor=None):
+        """
+        Mark downloaded months as saved.
+
+        Parameters:
+        - months (list): (station_id, year, month, days) tuples, days being how many
+        days the months page held.
+        - cursor (sqlite3.Cursor or None): Run inside this cursors transaction instead of
+        a new one, errors are then left to the caller.
+
+        Description:
+        - A month is complete once it was fetched after it closed (the same rule the
+        page cache uses for final pages) and had at least one day, complete months are
+        skipped by gap_fill. A closed month that parsed to no days, an error or empty
+        page, stays incomplete so gap_fill tries it again.
+        - Re-recording a month only moves it forward, a later short fetch never
+        marks a complete month incomplete again.
+        """
+        today = datetime.date.today()
+        rows = [
+            (
+                str(station_id),
+                int(year),
+                int(month),
+                days,
+                int(days > 0 and PageCache.is_final(year, month, today)),
+            )
+            for station_id, year, month, days in months
+        ]
+        if cursor is None:
+            try:
+                with self.database_context as own_cursor:
+                    self.record_coverage(months, own_cursor)
+            except sqlite3.OperationalError as error:
+                logging.warning("Couldnt record coverage for %s months: %s", len(months), error)
+            return
+
+        cursor.executemany(
+            """INSERT INTO coverage (station_id, year, month, days, complete)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (station_id, year, month) DO UPDATE SET
+            days = MAX(days, excluded.days),
+            complete = MAX(complete, excluded.complete),
+            fetched = CURRENT_TIMESTAMP""",
+            rows,
+        )
+
+    def seed_coverage(self, station_id):
+        """
+        Build a stations coverage from the weather table, for databases made before it existed.
+
+        Parameters:
+        - station_id (str): The station the saved weather belongs to.
+
+        Description:
+        - Does nothing once the station has any coverage rows.
+        - A seeded month is complete if every one of its days is saved and it has closed.
+        """
+        if not str(station_id).isdigit():
+            raise ValueError("station_id must be digits.")
+
+        try:
+            with self.database_context as cursor:
+                cursor.execute(
+                    f"""INSERT INTO coverage (station_id, year, month, days, complete)
+                    SELECT '{station_id}', year, month,
+                    COUNT(*) AS days,
+                    COUNT(*) = CAST(strftime('%d', date(MIN(sample_date), 'start of month',
+                    '+1 month', '-1 day')) AS INTEGER)
+                    AND date(MIN(sample_date), 'start of month', '+2 months') <= date('now')
+                    FROM weather
+                    WHERE station_id = '{station_id}'
+                    AND NOT EXISTS (SELECT 1 FROM coverage WHERE station_id = '{station_id}')
+                    GROUP BY year, month"""
+                )
+        except sqlite3.OperationalError as error:
+            logging.warning("Couldnt seed coverage for station %s: %s", station_id, error)
+
+    def get_complete_months(self, station_id):
+        """
+        List a stations months that never need downloading again.
+
+        Returns:
+        - set: (year, month) tuples, empty if the query failed.
+        """
+        if not str(station_id).isdigit():
+            raise ValueError("station_id must be digits.")
+
+        rows = self.get_query_data(
+            "SELECT year, month FROM coverage "
+            f"WHERE station_id = '{station_id}' AND complete = 1"
+        )
+        return set(rows or [])
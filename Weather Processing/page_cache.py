@@ -0,0 +1,187 @@
+"""On-disk cache of daily data pages with conditional revalidation."""
+
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+from datetime import date
+
+CacheEntry = namedtuple(
+    "CacheEntry", ["body", "etag", "last_modified", "fetched", "final"]
+)
+
+
+class PageCache:
+    """Caches one months page per (station id, year, month) on disk."""
+
+    def __init__(self, directory="page_cache", max_bytes=256 * 1024 * 1024):
+        """
+        Initialize the cache and measure what is already on disk.
+
+        Parameters:
+        - directory (str): Folder the cached pages are kept in, created if missing.
+        - max_bytes (int): Size cap for the cached pages, the least recently used go first.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if name.endswith(".html"):
+                self.total_bytes += os.path.getsize(os.path.join(self.directory, name))
+        logging.info("Page cache opened with %s bytes cached.", self.total_bytes)
+
+    def paths(self, station_id, year, month):
+        """Return the page and metadata paths for a month."""
+        stem = os.path.join(self.directory, f"{station_id}_{int(year)}_{int(month):02d}")
+        return (stem + ".html", stem + ".json")
+
+    @staticmethod
+    def is_final(year, month, fetched):
+        """
+        Check if a page fetched on the given day can never change again.
+
+        Parameters:
+        - year (int): The year of the cached month.
+        - month (int): The month of the cached month.
+        - fetched (date): The day the page was downloaded or last revalidated.
+
+        Returns:
+        - bool: True if the page was fetched after the month stopped being the current or
+        previous month, so it is served from disk without asking the server.
+        """
+        closed_year, closed_month = divmod(int(year) * 12 + int(month) + 1, 12)
+        return fetched >= date(closed_year, closed_month + 1, 1)
+
+    def get(self, station_id, year, month):
+        """
+        Look up a cached month.
+
+        Returns:
+        - CacheEntry or None: The cached page and its validators, None on a miss.
+        """
+        page_path, meta_path = self.paths(station_id, year, month)
+        try:
+            with open(meta_path, encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            with open(page_path, "rb") as page_file:
+                body = page_file.read()
+            # Bump the modification time so eviction keeps recently used pages.
+            os.utime(page_path)
+        except (OSError, ValueError):
+            return None
+
+        fetched = date.fromisoformat(meta["fetched"])
+        return CacheEntry(
+            body,
+            meta.get("etag"),
+            meta.get("last_modified"),
+            fetched,
+            self.is_final(year, month, fetched),
+        )
+
+    def put(self, station_id, year, month, body, headers=None):
+        """
+        Store a freshly downloaded month.
+
+        Parameters:
+        - body (bytes): The raw page.
+        - headers (mapping or None): The response headers, ETag and Last-Modified are kept.
+        """
+        headers = headers or {}
+        page_path, meta_path = self.paths(station_id, year, month)
+        try:
+            old_size = os.path.getsize(page_path) if os.path.exists(page_path) else 0
+            self.write_atomic(page_path, body)
+            self.write_meta(meta_path, headers.get("ETag"), headers.get("Last-Modified"))
+        except OSError as error:
+            logging.warning("Couldnt cache %s: %s", page_path, error)
+            return
+
+        with self.lock:
+            self.total_bytes += len(body) - old_size
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def revalidated(self, station_id, year, month, entry):
+        """Record that the server confirmed a cached month is still current (304)."""
+        _, meta_path = self.paths(station_id, year, month)
+        try:
+            self.write_meta(meta_path, entry.etag, entry.last_modified)
+        except OSError as error:
+            logging.warning("Couldnt update cache metadata %s: %s", meta_path, error)
+
+    def expire(self, station_id, year, month):
+        """
+        Make a cached month be revalidated on its next fetch, even a final one.
+
+        Description:
+        - The page and its validators are kept, so an unchanged month costs a 304
+        rather than a full download.
+        """
+        entry = self.get(station_id, year, month)
+        if entry is None:
+            return
+        _, meta_path = self.paths(station_id, year, month)
+        meta = {"etag": entry.etag, "last_modified": entry.last_modified, "fetched": "1970-01-01"}
+        try:
+            self.write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as error:
+            logging.warning("Couldnt expire cache metadata %s: %s", meta_path, error)
+
+    def validators(self, entry):
+        """Return the conditional request headers for a cached entry."""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def write_meta(self, meta_path, etag, last_modified):
+        """Write a months validators along with todays date."""
+        meta = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched": date.today().isoformat(),
+        }
+        self.write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+
+    def write_atomic(self, path, data):
+        """Write data to a temporary file and swap it into place."""
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+
+    def evict(self):
+        """
+        Delete the least recently used pages until the cache is under its size cap.
+
+        Description:
+        - Called with the lock held. Pages are ordered by modification time,
+        which get() bumps on every hit.
+        """
+        pages = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".html"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                pages.append((stat.st_mtime, stat.st_size, path))
+        pages.sort()
+
+        target = self.max_bytes * 0.9
+        for _, size, path in pages:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                os.remove(path[: -len(".html")] + ".json")
+            except OSError:
+                pass
+            self.total_bytes -= size
+        logging.info("Page cache evicted down to %s bytes.", self.total_bytes)
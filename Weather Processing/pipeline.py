@@ -0,0 +1,213 @@
+"""Stages downloaded months pass through, parsing then saving, while downloads continue."""
+
+import logging
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+class DatabaseWriter:
+    """A single writer thread that saves queued months to the database in batches."""
+
+    # Marks the end of the stream on the queue.
+    STOP = object()
+
+    def __init__(self, weather_db, station_id=None, batch_days=1000, max_pending_months=64):
+        """
+        Initialize the writer.
+
+        Parameters:
+        - weather_db (DBOperations): Where the months are saved.
+        - station_id (str or None): The station months without a month_key belong to,
+        the databases default station if None.
+        - batch_days (int): Days collected before they are written in one transaction.
+        - max_pending_months (int): Months waiting on the queue before producers block,
+        this bounds the memory used when downloads outpace the disk.
+        """
+        self.weather_db = weather_db
+        self.station_id = weather_db.DEFAULT_STATION if station_id is None else station_id
+        self.batch_days = batch_days
+        self.months = queue.Queue(maxsize=max_pending_months)
+        self.thread = None
+        self.days_written = 0
+
+    def __enter__(self):
+        """Start the writer thread."""
+        self.thread = threading.Thread(target=self.run, name="database-writer", daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Flush whatever is still queued, even when the scrape failed partway."""
+        self.close()
+
+    def submit(self, month_weather, month_key=None):
+        """
+        Queue one finished month for writing.
+
+        Parameters:
+        - month_weather (dict): Weather data keyed by date, as parsed from one page.
+        - month_key (tuple or None): The (station_id, year, month) the page was for,
+        the days are saved to that station and the month is recorded in the coverage
+        table once saved. Without one the days go to the writers station.
+
+        Description:
+        - Safe to call from any thread, blocks while the queue is full.
+        - Matches the consumer signature of WeatherScraper.stream_weather.
+        """
+        if month_weather or month_key:
+            self.months.put((month_weather or {}, month_key))
+
+    def close(self):
+        """Stop the writer once the queue is drained and wait for the last batch."""
+        if self.thread is not None:
+            self.months.put(self.STOP)
+            self.thread.join()
+            self.thread = None
+            logging.info("Database writer finished, %s days written.", self.days_written)
+
+    def run(self):
+        """
+        Writer thread loop.
+
+        Description:
+        - Gathers queued months into a batch until it holds batch_days days or the
+        queue runs dry, then saves the batch in one transaction per station.
+        """
+        # station_id -> {date: readings}
+        batch = {}
+        coverage = []
+        while True:
+            try:
+                item = self.months.get(timeout=0.5 if batch or coverage else None)
+            except queue.Empty:
+                self.write(batch, coverage)
+                batch, coverage = {}, []
+                continue
+
+            if item is self.STOP:
+                self.write(batch, coverage)
+                return
+
+            month_weather, month_key = item
+            station_id = self.station_id if month_key is None else month_key[0]
+            batch.setdefault(str(station_id), {}).update(month_weather)
+            if month_key is not None:
+                coverage.append((*month_key, len(month_weather)))
+            if sum(map(len, batch.values())) >= self.batch_days:
+                self.write(batch, coverage)
+                batch, coverage = {}, []
+
+    def write(self, batch, coverage):
+        """
+        Save one batch, a failed batch is logged so the stream keeps going.
+
+        Description:
+        - Each stations days and coverage rows are saved in one transaction, a month
+        is only marked saved if its days were, so a failed save leaves it looking
+        missing to gap_fill rather than complete.
+        """
+        for station_id in set(batch) | {str(month_key[0]) for month_key in coverage}:
+            station_weather = batch.get(station_id, {})
+            station_coverage = [row for row in coverage if str(row[0]) == station_id]
+            try:
+                saved = self.weather_db.save_data(
+                    station_weather, station_id, coverage=station_coverage
+                )
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                logging.critical("Database writer failed saving %s: %s", station_id, error)
+                saved = False
+            if saved:
+                self.days_written += len(station_weather)
+            else:
+                logging.critical(
+                    "Database writer lost %s days and %s months of station %s.",
+                    len(station_weather),
+                    len(station_coverage),
+                    station_id,
+                )
+
+
+class ParseStage:
+    """Parses downloaded pages in worker processes, off the download threads."""
+
+    def __init__(self, parse, consumer, workers=0, batch_pages=8):
+        """
+        Initialize the stage.
+
+        Parameters:
+        - parse (callable): Turns a list of raw pages into a list of weather dicts, it must
+        be picklable, like a module level function or a partial of one.
+        - consumer (callable): Called as consumer(month_weather, month_key) once a page is parsed.
+        - workers (int): Parsing processes, 0 parses inline on the thread that submits.
+        - batch_pages (int): Pages sent to a worker at once, fewer hand-offs for less pickling.
+        """
+        self.parse = parse
+        self.consumer = consumer
+        self.workers = workers
+        self.batch_pages = batch_pages
+        self.batch = []
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def __enter__(self):
+        """Start the worker processes, if any."""
+        if self.workers:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Parse whatever is still batched and wait for the workers."""
+        self.close()
+
+    def submit(self, body, month_key):
+        """
+        Queue one downloaded page for parsing.
+
+        Parameters:
+        - body (bytes or str): The raw daily data page.
+        - month_key (tuple): The (station_id, year, month) the page is for.
+
+        Description:
+        - Safe to call from any thread or from the event loop.
+        """
+        if self.executor is None:
+            self.consumer(self.parse([body])[0], month_key)
+            return
+
+        with self.lock:
+            self.batch.append((body, month_key))
+            if len(self.batch) < self.batch_pages:
+                return
+            batch, self.batch = self.batch, []
+        self.dispatch(batch)
+
+    def dispatch(self, batch):
+        """Send a batch of pages to a worker, its results are delivered when it finishes."""
+        keys = [month_key for _, month_key in batch]
+        future = self.executor.submit(self.parse, [body for body, _ in batch])
+        future.add_done_callback(lambda done: self.deliver(done, keys))
+
+    def deliver(self, future, keys):
+        """Hand a finished batch to the consumer, a failed batch is logged and dropped."""
+        try:
+            results = future.result()
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            logging.critical("Parse stage lost a batch of %s months: %s", len(keys), error)
+            return
+
+        for month_weather, month_key in zip(results, keys):
+            self.consumer(month_weather, month_key)
+
+    def close(self):
+        """Flush the last partial batch and stop the worker processes."""
+        if self.executor is None:
+            return
+
+        with self.lock:
+            batch, self.batch = self.batch, []
+        if batch:
+            self.dispatch(batch)
+        # Results are delivered on the pools own thread, shutdown waits for those too.
+        self.executor.shutdown(wait=True)
+        self.executor = None
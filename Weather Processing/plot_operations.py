@@ -4,6 +4,7 @@
 import logging
 import matplotlib as mpl
 import matplotlib.pyplot as plt
+import numpy as np
 
 from db_operations import DBOperations
 
@@ -11,17 +12,28 @@ from db_operations import DBOperations
 class PlotOperations:
     """Plots data onto a graph, visualization"""
 
+    # Set once the dark style is in rcParams, its the same for every plot.
+    style_applied = False
+
     def __init__(self):
         """Initialize PlotOperations with a database operations object."""
         self.db = DBOperations()
 
+    @classmethod
+    def apply_style(cls):
+        """Put the plot style into this process' rcParams, only the first call does anything."""
+        if not cls.style_applied:
+            mpl.rcParams["toolbar"] = "None"
+            plt.style.use("dark_background")
+            cls.style_applied = True
+
     # Tadgh Henry
     def create_line_plot(self, graph_weather_data, year, month):
         """
         Create a line plot to visualize daily average temperatures for a specific year and month.
 
         Parameters:
-        - graph_weather_data (list of tuples): Weather data for plotting the line graph.
+        - graph_weather_data (dict): 'day' and 'mean' arrays for plotting the line graph.
         - year (str): The year for which data is being plotted.
         - month (str): The month for which data is being plotted.
 
@@ -30,68 +42,281 @@ class PlotOperations:
         - Displays the line plot and requires user interaction to continue
         execution after plot display.
         """
+        self.apply_style()
+        _, axes = plt.subplots(figsize=(10, 6))
+        self.draw_line_plot(axes, graph_weather_data, year, month)
+        plt.tight_layout()
+        plt.show(block=True)
+
+    def draw_line_plot(self, axes, graph_weather_data, year, month):
+        """
+        Draw the daily average line plot onto axes, see create_line_plot.
+
+        Raises:
+        - ValueError: If year or month is missing or not a digit.
+        """
         if year is None or month is None:
             raise ValueError("Year or month was NoneType.")
         if year.isdigit() is False and month.isdigit() is False:
             raise ValueError("Year or month was not a digit.")
 
-        days = [row[0] for row in graph_weather_data]
-        mean_temps = [row[1] for row in graph_weather_data]
+        axes.grid()
+        axes.plot(
+            graph_weather_data["day"], graph_weather_data["mean"], linestyle="-", color="coral"
+        )
+        axes.set_title(f"Daily Avg Temperatures {year}-{month}")
+        axes.set_xlabel("Day of Month")
+        axes.set_ylabel("Avg Daily Temp")
+        axes.tick_params(axis="x", labelrotation=45)
+
+    @staticmethod
+    def largest_triangle_three_buckets(x, y, threshold):
+        """
+        Pick threshold points of a line that keep its shape, with Largest-Triangle-Three-Buckets.
+
+        Parameters:
+        - x (numpy.ndarray): Increasing x values as float64.
+        - y (numpy.ndarray): The value at each x, without NaN.
+        - threshold (int): Points to keep, the first and last are always kept.
+
+        Returns:
+        - numpy.ndarray: Indexes of the kept points, in order. Every index if there are
+        no more than threshold points.
+
+        Description:
+        - The points between the first and last are cut into threshold - 2 equal
+        buckets. Each bucket keeps the point making the largest triangle with the
+        point kept from the bucket before it and the average of the bucket after it.
+        - The buckets are padded into one 2D array, their averages and candidates come
+        from whole array operations. Only passing the kept point on to the next bucket
+        steps through the buckets, one small argmax each.
+        """
+        length = len(x)
+        if threshold < 3 or length <= threshold:
+            return np.arange(length)
+
+        candidates, next_x, next_y = PlotOperations.triangle_buckets(x, y, threshold - 2)
+        candidate_x, candidate_y = x[candidates], y[candidates]
+
+        kept = np.empty(threshold, dtype=np.int64)
+        kept[0], kept[-1] = 0, length - 1
+        previous = 0
+        for bucket in range(threshold - 2):
+            previous_x, previous_y = x[previous], y[previous]
+            # Twice each triangles area, the factor doesnt change which is largest.
+            areas = np.abs(
+                (previous_x - next_x[bucket]) * (candidate_y[bucket] - previous_y)
+                - (previous_x - candidate_x[bucket]) * (next_y[bucket] - previous_y)
+            )
+            previous = candidates[bucket, np.argmax(areas)]
+            kept[bucket + 1] = previous
+        return kept
 
-        # Plot the line graph
-        mpl.rcParams["toolbar"] = "None"
-        plt.style.use("dark_background")
-        plt.figure(figsize=(10, 6))
+    @staticmethod
+    def triangle_buckets(x, y, buckets):
+        """
+        Cut the points between the first and last into buckets for largest_triangle_three_buckets.
+
+        Returns:
+        - tuple: (a row of point indexes per bucket, short rows padded with repeats of
+        their last index, the x and y average of the bucket after each, the last point
+        after the last bucket)
+        """
+        length = len(x)
+        edges = (np.arange(buckets + 1) * ((length - 2) / buckets)).astype(np.int64) + 1
+        counts = np.diff(edges)
+        next_x = np.append(np.add.reduceat(x[: length - 1], edges[:-1]) / counts, x[-1])
+        next_y = np.append(np.add.reduceat(y[: length - 1], edges[:-1]) / counts, y[-1])
+        candidates = np.minimum(
+            edges[:-1, None] + np.arange(counts.max()), edges[1:, None] - 1
+        )
+        return candidates, next_x[1:], next_y[1:]
 
-        plt.grid()
-        plt.plot(days, mean_temps, linestyle="-", color="coral")
-        plt.title(f"Daily Avg Temperatures {year}-{month}")
-        plt.xlabel("Day of Month")
-        plt.ylabel("Avg Daily Temp")
-        plt.xticks(rotation=45)
+    def create_range_plot(self, graph_weather_data, start_date=None, end_date=None):
+        """
+        Create a line plot of daily average temperatures over any range of dates.
+
+        Parameters:
+        - graph_weather_data (dict): 'day' and 'mean' arrays, as fetch_daily_columns returns.
+        - start_date (str or None): First day shown, from the first day of data if None.
+        - end_date (str or None): Last day shown, to the last day of data if None.
+
+        Description:
+        - Years of days are downsampled to about one point per pixel of the plot
+        before drawing, see draw_range_plot.
+        - Displays the line plot and requires user interaction to continue
+        execution after plot display.
+        """
+        self.apply_style()
+        _, axes = plt.subplots(figsize=(10, 6))
+        self.draw_range_plot(axes, graph_weather_data, start_date, end_date)
         plt.tight_layout()
         plt.show(block=True)
 
+    def draw_range_plot(self, axes, graph_weather_data, start_date=None, end_date=None):
+        """
+        Draw the daily average line over a range of dates onto axes, see create_range_plot.
+
+        Raises:
+        - ValueError: If there are no days with an average to plot.
+
+        Description:
+        - Days without an average are left out, then largest_triangle_three_buckets
+        keeps as many points as the axes is pixels wide. Peaks and dips stay visible
+        while matplotlib only draws a few thousand points, even for the whole record.
+        """
+        days = graph_weather_data["day"]
+        means = graph_weather_data["mean"]
+        present = ~np.isnan(means)
+        days, means = days[present], means[present]
+        if days.size == 0:
+            raise ValueError("No daily averages in the range.")
+
+        kept = self.largest_triangle_three_buckets(
+            days.astype(np.int64).astype(np.float64),
+            means,
+            max(3, int(axes.bbox.width)),
+        )
+        axes.grid()
+        axes.plot(days[kept], means[kept], linestyle="-", linewidth=0.8, color="coral")
+        axes.set_title(
+            f"Daily Avg Temperatures {start_date or days[0]} to {end_date or days[-1]}"
+        )
+        axes.set_xlabel("Date")
+        axes.set_ylabel("Avg Daily Temp")
+        axes.tick_params(axis="x", labelrotation=45)
+
+    @staticmethod
+    def group_by_month(days, values):
+        """
+        Sort daily values by calendar month, then by value, skipping NaN.
+
+        Returns:
+        - tuple: (month indexes 0 to 11 with any values, the sorted values, where each
+        of those months starts in them, how many values each has)
+        """
+        present = ~np.isnan(values)
+        months = days[present].astype("datetime64[M]").astype(np.int64) % 12
+        order = np.lexsort((values[present], months))
+
+        counts = np.bincount(months, minlength=12)
+        filled = np.flatnonzero(counts)
+        counts = counts[filled]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        return filled, values[present][order], starts, counts
+
+    @staticmethod
+    def sorted_quantile(ordered, starts, counts, fraction):
+        """Interpolate a quantile of every sorted group at once, as np.percentile does."""
+        position = starts + fraction * (counts - 1)
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, starts + counts - 1)
+        return ordered[below] + (position - below) * (ordered[above] - ordered[below])
+
+    def box_statistics(self, days, values, whisker=1.5):
+        """
+        Compute a box per calendar month from daily values, ready for matplotlib's bxp.
+
+        Parameters:
+        - days (numpy.ndarray): datetime64[D] day of each value.
+        - values (numpy.ndarray): The daily values, NaN is skipped.
+        - whisker (float): Whiskers reach the furthest value within this many
+        interquartile ranges of the box, as plt.boxplot does.
+
+        Returns:
+        - list: A bxp stats dict ('label', 'med', 'q1', 'q3', 'whislo', 'whishi',
+        'fliers', 'mean') per month with any values, in month order.
+
+        Description:
+        - One sort groups the values by month in order, the quartiles, whiskers and
+        means of every month are then computed together.
+        """
+        filled, ordered, starts, counts = self.group_by_month(days, values)
+        if filled.size == 0:
+            return []
+
+        box = {
+            key: self.sorted_quantile(ordered, starts, counts, fraction)
+            for key, fraction in (("q1", 0.25), ("med", 0.5), ("q3", 0.75))
+        }
+        reach = whisker * (box["q3"] - box["q1"])
+        inside = (ordered >= np.repeat(box["q1"] - reach, counts)) & (
+            ordered <= np.repeat(box["q3"] + reach, counts)
+        )
+        box["whislo"] = np.minimum.reduceat(np.where(inside, ordered, np.inf), starts)
+        box["whishi"] = np.maximum.reduceat(np.where(inside, ordered, -np.inf), starts)
+        box["mean"] = np.add.reduceat(ordered, starts) / counts
+
+        splits = np.cumsum(counts)[:-1]
+        fliers = [
+            month_values[~month_inside]
+            for month_values, month_inside in zip(
+                np.split(ordered, splits), np.split(inside, splits)
+            )
+        ]
+        return [
+            {
+                "label": f"{month + 1:02d}",
+                "fliers": fliers[index],
+                **{key: statistic[index] for key, statistic in box.items()},
+            }
+            for index, month in enumerate(filled)
+        ]
+
     # Cole Cianflone
     def create_year_boxplot_graph(self, graph_weather_data, start_year, end_year):
         """
         Create a box plot to visualize monthly temperature distributions for a range of years.
 
         Parameters:
-        - graph_weather_data (list of tuples): Weather data for plotting the box plot.
+        - graph_weather_data (dict): 'day' and 'mean' arrays, every daily mean in the range.
         - start_year (str): The starting year of the data range.
         - end_year (str): The ending year of the data range.
 
         -Exceptions
             ValueError if one of the ranges are a NoneType
         Description:
-        - Generates a box plot representing the distribution of monthly temperatures
-          for a specified range of years.
+        - Generates a box plot representing the distribution of daily mean temperatures
+          in each month for a specified range of years.
+        - The boxes are computed by box_statistics and drawn with bxp, so matplotlib
+        never sorts the raw days itself.
         - Displays the box plot and requires user interaction to continue
         execution after plot display.
         """
+        self.apply_style()
+        _, axes = plt.subplots(figsize=(10, 6))
+        self.draw_box_plot(axes, graph_weather_data, start_year, end_year)
+        plt.tight_layout()
+        plt.show(block=True)
+
+    def draw_box_plot(self, axes, graph_weather_data, start_year, end_year):
+        """
+        Draw the monthly box plot onto axes, see create_year_boxplot_graph.
+
+        Raises:
+        - ValueError: If a year is missing or not a digit.
+        """
         if start_year is None or end_year is None:
             raise ValueError("One of the year ranges was a NoneType.")
         if start_year.isdigit() is False and end_year.isdigit() is False:
             raise ValueError("One of the ranges was not and integar")
 
-        year_month_temperature_info = [month[1:] for month in graph_weather_data]
-        mpl.rcParams["toolbar"] = "None"
-        plt.style.use("dark_background")
-        plt.figure(figsize=(10, 6))
-
-        plt.boxplot(
-            year_month_temperature_info,
+        month_statistics = self.box_statistics(
+            graph_weather_data["day"], graph_weather_data["mean"]
+        )
+        axes.bxp(
+            month_statistics,
+            positions=[int(stats["label"]) for stats in month_statistics],
             medianprops={"color": "dodgerblue", "linewidth": 1.5},
+            flierprops={"markersize": 2, "alpha": 0.4},
         )
-        plt.xlabel("Months")
-        plt.ylabel("Temperature (Celsius)")
-        plt.title(f"Monthly Temperature Distribution for: {start_year} to {end_year}")
-        plt.tight_layout()
-        plt.show(block=True)
+        axes.set_xlabel("Months")
+        axes.tick_params(axis="x", labelrotation=0)
+        axes.set_ylabel("Temperature (Celsius)")
+        axes.set_title(f"Monthly Temperature Distribution for: {start_year} to {end_year}")
 
     # Cole Cianflone, Tadgh Henry
-    def create(self, start_year=None, end_year=None, month=None):
+    def create(self, start_year=None, end_year=None, month=None, station_id=None):
         """
         Create a graph based on the provided parameters.
 
@@ -99,13 +324,14 @@ class PlotOperations:
         - start_year (str or None): The starting year for data retrieval. Defaults to None.
         - end_year (str or None): The ending year for data retrieval. Defaults to None.
         - month (str or None): The month for data retrieval. Defaults to None.
+        - station_id (str or None): The station to plot, the databases default if None.
 
         Description:
         - Fetches weather data based on provided parameters and generates a graph.
         - If a specific month is provided, creates a line plot; otherwise, creates a box plot.
         """
         try:
-            weather_data = self.fetch_data(start_year, end_year, month)
+            weather_data = self.fetch_data(start_year, end_year, month, station_id)
 
             if month:
                 logging.info(r"\n\nMaking line plot.")
@@ -122,8 +348,30 @@ class PlotOperations:
         except ValueError as error:
             logging.info(r"\n\Value Error when calling graphs. %e", error)
 
+    def create_range(self, start_date=None, end_date=None, station_id=None):
+        """
+        Create a line plot of a stations daily averages between two dates.
+
+        Parameters:
+        - start_date (str or None): First day, 'YYYY-MM-DD', from the start of the record
+        if None.
+        - end_date (str or None): Last day, 'YYYY-MM-DD', to the end of the record if None.
+        - station_id (str or None): The station to plot, the databases default if None.
+        """
+        if station_id is None:
+            station_id = self.db.DEFAULT_STATION
+        try:
+            weather_data = self.db.fetch_daily_columns(station_id, start_date, end_date)
+            if weather_data is None:
+                raise ValueError("Couldnt read the daily data.")
+
+            logging.info(r"\n\nMaking date range line plot.")
+            self.create_range_plot(weather_data, start_date, end_date)
+        except ValueError as error:
+            logging.info(r"\n\Value Error when calling graphs. %s", error)
+
     # Tadgh Henry
-    def fetch_data(self, start_year=None, end_year=None, month=None):
+    def fetch_data(self, start_year=None, end_year=None, month=None, station_id=None):
         """
         Fetch weather data based on provided parameters.
 
@@ -131,21 +379,30 @@ class PlotOperations:
         - start_year (str or None): The starting year for data retrieval. Defaults to None.
         - end_year (str or None): The ending year for data retrieval. Defaults to None.
         - month (str or None): The month for data retrieval. Defaults to None.
+        - station_id (str or None): The station to fetch, the databases default if None.
 
         Returns:
-        - list of tuples: Fetched weather data based on the provided parameters.
+        - dict: Fetched weather data based on the provided parameters, as NumPy columns.
 
         Description:
         - Fetches weather data from the database based on the specified criteria.
         - If a specific month is provided, retrieves year-month-based data;
-          otherwise, retrieves monthly averages within the given year range.
+          otherwise, retrieves every daily reading within the given year range.
         """
+        if station_id is None:
+            station_id = self.db.DEFAULT_STATION
         try:
             if month is not None and month.isdigit() is True:
                 logging.info(r"\n\Made line plot request to db.")
-                return self.db.fetch_year_month_average(start_year, month)
+                return self.db.fetch_year_month_average(
+                    start_year, month, as_columns=True, station_id=station_id
+                )
             logging.info(r"\n\nNothing special, defaulting to box plot db call.")
-            return self.db.fetch_monthly_averages(start_year, end_year)
+            if not (start_year.isdigit() and end_year.isdigit()):
+                raise ValueError("start_year and end_year must both be digits.")
+            return self.db.fetch_daily_columns(
+                station_id, f"{int(start_year):04d}-01-01", f"{int(end_year):04d}-12-31"
+            )
         except ValueError as error:
             logging.warning(r"\n\nValue error before calling database %s", error)
         return None
@@ -0,0 +1,109 @@
+"""Size bounded LRU cache of query results, invalidated whenever the data changes."""
+
+import logging
+import sys
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    """Caches query results for one database file, shared by every DBOperations using it."""
+
+    # database name -> QueryCache
+    caches = {}
+    caches_lock = threading.Lock()
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        """
+        Initialize an empty cache.
+
+        Parameters:
+        - max_bytes (int): Rough memory cap for the cached results, the least recently
+        used are dropped first.
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_database(cls, database_name):
+        """Return the cache shared by everything reading database_name."""
+        with cls.caches_lock:
+            if database_name not in cls.caches:
+                cls.caches[database_name] = cls()
+            return cls.caches[database_name]
+
+    @staticmethod
+    def make_key(sql_query, *params):
+        """Build a key that ignores whitespace differences in the query."""
+        return (" ".join(sql_query.split()), params)
+
+    @staticmethod
+    def result_size(result):
+        """Estimate the bytes a query result holds."""
+        if isinstance(result, dict):
+            return sum(column.nbytes for column in result.values())
+        return sys.getsizeof(result) + sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in result
+        )
+
+    def get(self, key):
+        """
+        Look up a result.
+
+        Returns:
+        - list, dict or None: A copy of the cached rows or columns, the caller can change
+        it like a freshly queried result. None on a miss.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+
+        result = entry[0]
+        if isinstance(result, dict):
+            return {name: column.copy() for name, column in result.items()}
+        return list(result)
+
+    def put(self, key, generation, result):
+        """
+        Cache a result read while the data was at generation.
+
+        Parameters:
+        - key (tuple): From make_key.
+        - generation (int): The generation read before the query ran, a result that
+        raced a write is dropped rather than cached stale.
+        - result (list or dict): Rows, or NumPy columns. The cache keeps read-only copies,
+        so the caller still owns result.
+        """
+        size = self.result_size(result)
+        if size > self.max_bytes:
+            return
+        if isinstance(result, dict):
+            result = {name: column.copy() for name, column in result.items()}
+            for column in result.values():
+                column.flags.writeable = False
+        else:
+            result = list(result)
+
+        with self.lock:
+            if generation != self.generation:
+                return
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (result, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, dropped_size) = self.entries.popitem(last=False)
+                self.total_bytes -= dropped_size
+
+    def bump(self):
+        """Mark the data as changed, every cached result is dropped."""
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.total_bytes = 0
+        logging.info("Query cache cleared, data generation %s.", self.generation)
@@ -0,0 +1,197 @@
+"""Local stand-in for the climate data site that replays recorded daily data pages."""
+
+import calendar
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The year and month a daily_data_e.html request asks for. A request without a month is
+# the earliest date lookup, which the site answers with the stations first month.
+PAGE_QUERY = re.compile(r"[?&]Year=(\d+)(?:&Month=(\d+))?")
+# The month a daily data page reports on, from its title or caption.
+PAGE_MONTH = re.compile(r"Daily Data Report for ([A-Z][a-z]+) (\d{4})")
+MONTH_NUMBERS = {name: number for number, name in enumerate(calendar.month_name) if name}
+
+
+def synthetic_page(year, month, seed=0):
+    """
+    Build a page shaped like Environment Canada's daily data report.
+
+    Parameters:
+    - year (int): The year the page reports on.
+    - month (int): The month the page reports on.
+    - seed (int): Changes the generated readings.
+
+    Returns:
+    - str: The page html, with missing cells, blank cells and summary rows mixed in.
+    """
+    rnd = random.Random(year * 100 + month + seed)
+    name = calendar.month_name[month]
+
+    def cell():
+        roll = rnd.random()
+        if roll < 0.04:
+            return '<td class="text-right">&nbsp;<abbr title="Missing">M</abbr></td>'
+        if roll < 0.08:
+            return '<td class="text-right">&nbsp;</td>'
+        return f'<td class="text-right">{rnd.uniform(-35, 35):.1f}</td>'
+
+    rows = []
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        cells = "\n".join(cell() for _ in range(11))
+        rows.append(
+            "<tr>\n"
+            f'<th scope="row" class="text-center"><abbr title="{name} {day}, {year}">'
+            f"{day:02d}</abbr></th>\n{cells}\n</tr>"
+        )
+    for label in ("Sum", "Avg", "Xtrm"):
+        cells = "\n".join(cell() for _ in range(11))
+        rows.append(f'<tr class="hidden-xs">\n<th scope="row">{label}</th>\n{cells}\n</tr>')
+
+    headers = "".join(f'<th scope="col">Column {index}</th>' for index in range(11))
+    return (
+        "<!DOCTYPE html>\n<html lang=\"en\"><head>"
+        f"<title>Daily Data Report for {name} {year} - Climate</title></head>\n<body>\n"
+        '<table class="data-table table-striped table-hover">\n'
+        f"<caption>Daily Data Report for {name} {year}</caption>\n"
+        f'<thead><tr><th scope="col">DAY</th>{headers}</tr></thead>\n'
+        "<tbody>\n" + "\n".join(rows) + "\n</tbody>\n</table>\n</body></html>\n"
+    )
+
+
+class ReplayPages:
+    """The page served for each month, recorded pages first and synthetic ones after."""
+
+    def __init__(self, pages=(), first_month=(1900, 1), seed=0):
+        """
+        Index the recorded pages by month.
+
+        Parameters:
+        - pages (iterable): Decoded recorded pages, each served for the month its title
+        reports on. Every other month is served a synthetic_page built for it.
+        - first_month (tuple): The (year, month) the earliest date lookup answers with,
+        moved back to the oldest recorded page if there is an older one.
+        - seed (int): Seeds the synthetic pages, so every run serves the same ones.
+        """
+        self.pages = {}
+        for page in pages:
+            match = PAGE_MONTH.search(page)
+            if match is not None and match.group(1) in MONTH_NUMBERS:
+                month_key = (int(match.group(2)), MONTH_NUMBERS[match.group(1)])
+                self.pages[month_key] = page.encode("utf-8")
+        self.first_month = min([tuple(first_month), *self.pages])
+        self.seed = seed
+        self.lock = threading.Lock()
+
+    def month_for(self, path):
+        """
+        Find the month a request asks for.
+
+        Returns:
+        - tuple or None: The requested (year, month), first_month for the earliest date
+        lookup, None if the path isnt a daily data request.
+        """
+        match = PAGE_QUERY.search(path)
+        if match is None:
+            return None
+        if match.group(2) is None:
+            return self.first_month
+        month_key = (int(match.group(1)), int(match.group(2)))
+        return month_key if 1 <= month_key[1] <= 12 else None
+
+    def page_for(self, year, month):
+        """Return the encoded page served for a month, building a synthetic one the first time."""
+        with self.lock:
+            page = self.pages.get((year, month))
+        if page is None:
+            page = synthetic_page(year, month, self.seed).encode("utf-8")
+            with self.lock:
+                page = self.pages.setdefault((year, month), page)
+        return page
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Answers daily data requests from the servers pages, keeping connections alive."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes, Nagle would hold the body back
+    # for a delayed ACK on every reused connection.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Keep the benchmark output clean, requests arent logged."""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Serve the page for the requested month after the configured delay."""
+        replay = self.server
+        month_key = replay.pages.month_for(self.path)
+        if month_key is None:
+            self.respond(404, b"")
+            return
+
+        delay, fail = replay.next_response()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self.respond(503, b"")
+            return
+
+        self.respond(200, replay.pages.page_for(*month_key))
+
+    def respond(self, status, body):
+        """Send a complete response with a Content-Length so the connection can be reused."""
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """Serves daily data pages on localhost with injected latency, jitter and errors."""
+
+    daemon_threads = True
+
+    def __init__(self, pages=None, latency=0.05, jitter=0.02, error_rate=0.0, seed=0):
+        """
+        Initialize the server on a free localhost port.
+
+        Parameters:
+        - pages (ReplayPages or None): The pages served, only synthetic pages if None.
+        - latency (float): Seconds every response is held back.
+        - jitter (float): Up to this many seconds are randomly added to the latency.
+        - error_rate (float): Share of requests answered with a 503.
+        - seed (int): Seeds the jitter and errors, so runs are repeatable.
+        """
+        super().__init__(("127.0.0.1", 0), ReplayHandler)
+        self.pages = ReplayPages() if pages is None else pages
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def base_url(self):
+        """The url to hand WeatherScraper in place of the real site."""
+        return f"http://127.0.0.1:{self.server_address[1]}/climate_data"
+
+    def __enter__(self):
+        """Start serving on a background thread, shutdown in __exit__ ends it."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop serving and release the port."""
+        self.shutdown()
+        self.server_close()
+
+    def next_response(self):
+        """Count a request and return its (delay seconds, should fail)."""
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            return delay, self.random.random() < self.error_rate
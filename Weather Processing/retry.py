@@ -0,0 +1,202 @@
+"""Retry policy and circuit breaker for requests to the climate data site."""
+
+import logging
+import random
+import threading
+import time
+from http.client import HTTPException
+from urllib.error import HTTPError, URLError
+
+
+class RetryPolicy:
+    """Jittered exponential backoff between attempts at one request."""
+
+    # Status codes worth trying again, anything else in the 4xx range wont change.
+    RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+    def __init__(self, attempts=4, base_delay=0.5, max_delay=30):
+        """
+        Initialize the policy.
+
+        Parameters:
+        - attempts (int): Tries per request, including the first.
+        - base_delay (float): Seconds the backoff starts from.
+        - max_delay (float): The longest a single backoff can be.
+        """
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """
+        Seconds to wait after a failed attempt.
+
+        Parameters:
+        - attempt (int): The zero based attempt that just failed.
+
+        Returns:
+        - float: A random delay up to base_delay * 2 ** attempt, "full jitter" keeps many
+        threads from retrying in lock step.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def is_retryable(self, error):
+        """
+        Check if a failed request is worth trying again.
+
+        Parameters:
+        - error (Exception or int): The raised error, or the HTTP status that came back.
+
+        Returns:
+        - bool: True for connection problems, timeouts and the statuses in RETRY_STATUSES.
+        """
+        if isinstance(error, int):
+            return error in self.RETRY_STATUSES
+        if isinstance(error, HTTPError):
+            return error.code in self.RETRY_STATUSES
+        # EOFError covers a connection dropped partway through the body.
+        return isinstance(error, (URLError, OSError, HTTPException, EOFError))
+
+
+class CircuitBreaker:
+    """Pauses every request to a host while it keeps failing."""
+
+    def __init__(self, failure_threshold=5, cooldown=5, max_cooldown=120):
+        """
+        Initialize the breaker closed.
+
+        Parameters:
+        - failure_threshold (int): Failures in a row that open the breaker.
+        - cooldown (float): Seconds requests are held back the first time it opens.
+        - max_cooldown (float): The cooldown doubles each time the breaker reopens, up to this.
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.current_cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    def remaining(self):
+        """Return the seconds until the breaker lets requests through again."""
+        with self.lock:
+            return max(0.0, self.open_until - time.monotonic())
+
+    def wait(self):
+        """Block while the breaker is open."""
+        delay = self.remaining()
+        if delay:
+            time.sleep(delay)
+
+    def record_success(self):
+        """Close the breaker and reset its cooldown."""
+        with self.lock:
+            self.failures = 0
+            self.current_cooldown = self.cooldown
+
+    def record_failure(self):
+        """
+        Count a failed request, opening the breaker at the threshold.
+
+        Description:
+        - Once a cooldown passes the breaker is half open, a single further failure
+        opens it again with a doubled cooldown.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.failure_threshold:
+                return
+
+            self.open_until = time.monotonic() + self.current_cooldown
+            logging.warning(
+                "Server keeps failing, holding requests back for %s seconds.",
+                self.current_cooldown,
+            )
+            self.current_cooldown = min(self.max_cooldown, self.current_cooldown * 2)
+            self.failures = self.failure_threshold - 1
+
+
+class FailedMonthLedger:
+    """Remembers which months still failed after every retry, backed by the database."""
+
+    def __init__(self, weather_db):
+        """
+        Load the months that failed on earlier runs.
+
+        Parameters:
+        - weather_db (DBOperations): Stores the ledger in its failed_months table.
+        """
+        self.weather_db = weather_db
+        self.lock = threading.Lock()
+        self.failed = set(weather_db.get_failed_months() or [])
+
+    def record(self, station_id, year, month, error):
+        """Add a month that couldnt be downloaded."""
+        with self.lock:
+            self.failed.add((str(station_id), int(year), int(month)))
+        self.weather_db.record_failed_month(station_id, year, month, error)
+
+    def resolve(self, station_id, year, month):
+        """Drop a month from the ledger once it downloads, only touching the database if needed."""
+        key = (str(station_id), int(year), int(month))
+        with self.lock:
+            if key not in self.failed:
+                return
+            self.failed.discard(key)
+        self.weather_db.clear_failed_month(station_id, year, month)
+
+    def months(self, station_id=None):
+        """
+        List the months still waiting on a successful download.
+
+        Returns:
+        - list: Sorted (station id, year, month) tuples, for one station if given.
+
+        Description:
+        - Read from the failed_months table, so months a purge cleared are gone, and
+        the remembered set is refreshed from it. The set is only used if the read fails.
+        """
+        rows = self.weather_db.get_failed_months(station_id)
+        with self.lock:
+            if rows is not None:
+                self.failed = {
+                    key
+                    for key in self.failed
+                    if station_id is not None and key[0] != str(station_id)
+                }
+                self.failed.update(
+                    (str(row_station), int(year), int(month))
+                    for row_station, year, month in rows
+                )
+            return sorted(
+                key for key in self.failed if station_id is None or key[0] == str(station_id)
+            )
+
+
+class RequestGuards:
+    """Everything one scrapers requests go through on their way to the site."""
+
+    def __init__(self, retry_policy=None, circuit_breaker=None):
+        """
+        Initialize the guards, without a rate limit or failure ledger.
+
+        Parameters:
+        - retry_policy (RetryPolicy or None): Backoff between attempts, the defaults if None.
+        - circuit_breaker (CircuitBreaker or None): Shared failure breaker, a new one if None.
+        """
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        # Shared with other scrapers hitting the same host, see scheduler.RateLimiter.
+        self.rate_limiter = None
+        # Set by ScrapingActor, see FailedMonthLedger.
+        self.failure_ledger = None
+
+    def wait_for_rate_limit(self):
+        """Block until the rate limiter, when one is set, allows another request."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+    def rate_limit_delay(self):
+        """Claim a request slot and return the seconds to wait, for callers that cant block."""
+        return 0 if self.rate_limiter is None else self.rate_limiter.reserve()
@@ -0,0 +1,183 @@
+"""Rolling window means, minimums and maximums over a stations daily temperatures."""
+
+import csv
+import logging
+import math
+
+import numpy as np
+
+from db_operations import DBOperations
+
+
+class RollingStatistics:
+    """Trailing moving window statistics, each window computed in O(n) NumPy passes."""
+
+    # Window lengths in days, a week, a month and a year.
+    DEFAULT_WINDOWS = (7, 30, 365)
+
+    def __init__(self, weather_db=None, min_fraction=0.8):
+        """
+        Initialize the engine.
+
+        Parameters:
+        - weather_db (DBOperations or None): Where the daily record is read from, a new
+        DBOperations if None.
+        - min_fraction (float): Share of a windows days that need a value before the
+        window gets a result, windows over bigger gaps are NaN.
+        """
+        self.weather_db = DBOperations() if weather_db is None else weather_db
+        self.min_fraction = min_fraction
+
+    @staticmethod
+    def daily_axis(days, values):
+        """
+        Spread readings onto an unbroken run of days, so a window of n rows is n days.
+
+        Parameters:
+        - days (numpy.ndarray): datetime64[D] days in order, possibly with gaps.
+        - values (numpy.ndarray): The reading of each day.
+
+        Returns:
+        - tuple: (every day from the first to the last, values with NaN on the added days)
+        """
+        axis = np.arange(days[0], days[-1] + np.timedelta64(1, "D"))
+        spread = np.full(len(axis), np.nan)
+        spread[(days - days[0]).astype(np.int64)] = values
+        return axis, spread
+
+    @staticmethod
+    def window_sums(values, window):
+        """
+        Sum and count the non NaN values of every trailing window from running totals.
+
+        Returns:
+        - tuple: (sums, counts) arrays the length of values, the first window - 1
+        entries cover only the days before them.
+        """
+        present = ~np.isnan(values)
+        totals = np.concatenate(([0.0], np.cumsum(np.where(present, values, 0.0))))
+        counts = np.concatenate(([0], np.cumsum(present)))
+        lagged = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+        return totals[1:] - totals[lagged], counts[1:] - counts[lagged]
+
+    @staticmethod
+    def window_extreme(values, window, function, fill):
+        """
+        Take the largest or smallest value of every trailing window in O(n).
+
+        Parameters:
+        - values (numpy.ndarray): The series, NaN is skipped.
+        - window (int): Days per window.
+        - function (numpy.ufunc): np.maximum or np.minimum.
+        - fill (float): The identity of function, -inf for maximum and inf for minimum.
+
+        Returns:
+        - numpy.ndarray: The extreme of each window ending at each day, fill where the
+        window held no values.
+
+        Description:
+        - The series is cut into blocks of window days, within each block running
+        extremes are accumulated forwards and backwards. Any window spans at most two
+        blocks, so its extreme is the backward run at its start against the forward
+        run at its end. This gives a monotonic deques O(n) without a Python loop.
+        """
+        length = len(values)
+        blocks = -(-(length + window - 1) // window)
+        padded = np.full(blocks * window, fill)
+        padded[window - 1 : window - 1 + length] = np.where(np.isnan(values), fill, values)
+
+        padded = padded.reshape(blocks, window)
+        forward = function.accumulate(padded, axis=1).ravel()
+        backward = function.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+        starts = np.arange(length)
+        return function(backward[starts], forward[starts + window - 1])
+
+    def window_statistics(self, values, window):
+        """
+        Compute one windows rolling mean, minimum and maximum.
+
+        Returns:
+        - dict: 'mean', 'min' and 'max' arrays the length of values, NaN where the
+        window ending there has fewer than min_fraction of its days.
+        """
+        sums, counts = self.window_sums(values, window)
+        enough = counts >= max(1, int(np.ceil(window * self.min_fraction)))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sums / counts
+        return {
+            "mean": np.where(enough, mean, np.nan),
+            "min": np.where(
+                enough, self.window_extreme(values, window, np.minimum, np.inf), np.nan
+            ),
+            "max": np.where(
+                enough, self.window_extreme(values, window, np.maximum, -np.inf), np.nan
+            ),
+        }
+
+    def rolling(
+        self,
+        station_id=DBOperations.DEFAULT_STATION,
+        start_date=None,
+        end_date=None,
+        windows=DEFAULT_WINDOWS,
+        reading="mean",
+    ):
+        """
+        Compute rolling statistics of a stations daily readings.
+
+        Parameters:
+        - station_id (str or int): The station to use.
+        - start_date (str, datetime.date or None): First day, from the start of the record
+        if None.
+        - end_date (str, datetime.date or None): Last day, to the end of the record if None.
+        - windows (iterable): Window lengths in days.
+        - reading (str): 'min', 'max' or 'mean' daily temperatures.
+
+        Returns:
+        - dict or None: 'day', every day in the range, 'value', the reading of each day
+        (NaN when missing), and 'windows', window length -> window_statistics.
+        None if there is no data in the range.
+
+        Description:
+        - The range is read with one columnar query, windows trail so each result
+        only uses days up to and including its own.
+        - Days missing from the record count as gaps, never as zeros.
+        """
+        columns = self.weather_db.fetch_daily_columns(station_id, start_date, end_date)
+        if columns is None or columns["day"].size == 0:
+            logging.info("No daily data to smooth for station %s.", station_id)
+            return None
+
+        days, values = self.daily_axis(columns["day"], columns[reading])
+        return {
+            "day": days,
+            "value": values,
+            "windows": {
+                int(window): self.window_statistics(values, int(window)) for window in windows
+            },
+        }
+
+    @staticmethod
+    def export_csv(result, path):
+        """
+        Write a rolling result to a CSV file, one row per day.
+
+        Parameters:
+        - result (dict): As returned by rolling.
+        - path (str): The file to write, replaced if it exists.
+
+        Description:
+        - Columns are 'date', 'value' and '<statistic>_<window>d' for each window,
+        gaps are left blank.
+        """
+        columns = [("value", result["value"])] + [
+            (f"{statistic}_{window}d", values)
+            for window, statistics in result["windows"].items()
+            for statistic, values in statistics.items()
+        ]
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["date"] + [name for name, _ in columns])
+            rounded = [np.round(values, 2).tolist() for _, values in columns]
+            for day, *row in zip(result["day"].astype(str), *rounded):
+                writer.writerow([day] + ["" if math.isnan(value) else value for value in row])
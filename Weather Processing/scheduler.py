@@ -0,0 +1,203 @@
+"""Scrapes many weather stations at once under a shared request rate."""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.client import HTTPException
+from tqdm import tqdm
+
+
+class RateLimiter:
+    """Spaces requests to one host evenly, allowing a small burst."""
+
+    def __init__(self, requests_per_second, burst=1):
+        """
+        Initialize the limiter.
+
+        Parameters:
+        - requests_per_second (float): The most requests allowed per second on average.
+        - burst (int): Requests that may go out back to back after an idle spell.
+
+        Raises:
+        - ValueError: If the rate or burst isnt positive.
+        """
+        if requests_per_second <= 0 or burst < 1:
+            raise ValueError("The request rate and burst must both be positive.")
+
+        self.interval = 1 / requests_per_second
+        self.burst = burst
+        self.next_free = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Claim the next request slot.
+
+        Returns:
+        - float: Seconds the caller must wait before sending its request.
+        """
+        with self.lock:
+            now = time.monotonic()
+            # Idle time earns back up to burst slots, but no more.
+            slot = max(self.next_free, now - (self.burst - 1) * self.interval)
+            self.next_free = slot + self.interval
+        return max(0.0, slot - now)
+
+    def acquire(self):
+        """Block until the caller may send its request."""
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+
+class StationScheduler:
+    """Interleaves the months of many stations over one shared worker pool."""
+
+    def __init__(self, weather_scraper, station_ids, requests_per_second=4, workers=8):
+        """
+        Initialize the scheduler.
+
+        Parameters:
+        - weather_scraper (WeatherScraper): Downloads and parses the pages.
+        - station_ids (iterable): The StationIDs to scrape, duplicates are dropped.
+        - requests_per_second (float): Global request cap for the climate data host.
+        - workers (int): Threads shared by every station.
+
+        Description:
+        - run installs the rate limiter on weather_scraper, so pages served from the
+        page cache dont use up any of the request rate.
+        """
+        self.weather_scraper = weather_scraper
+        self.station_ids = list(dict.fromkeys(str(station) for station in station_ids))
+        self.workers = workers
+        self.rate_limiter = RateLimiter(requests_per_second)
+
+        # station id -> [months done, months total]
+        self.progress = {station: [0, 0] for station in self.station_ids}
+
+    def station_months(self, station_id, start_year_override=None):
+        """
+        List the (station, year, month) jobs for one station.
+
+        Returns:
+        - list: The stations jobs, oldest month first. Empty if its start date couldnt be found.
+
+        Description:
+        - A failed lookup, like a timeout or a dropped connection, only leaves out this
+        station, the others still run.
+        """
+        try:
+            if start_year_override:
+                start_year, start_month = int(start_year_override), 1
+            else:
+                earliest = self.weather_scraper.get_earliest_date(station_id)
+                start_year, start_month = earliest["Year"], earliest["Month"]
+        except (OSError, HTTPException, TypeError, AttributeError) as error:
+            logging.warning("Couldnt find the start date for station %s: %s", station_id, error)
+            return []
+
+        end_year = time.localtime().tm_year
+        return [
+            (station_id, year, month)
+            for year in range(start_year, end_year + 1)
+            for month in range(start_month if year == start_year else 1, 13)
+        ]
+
+    @staticmethod
+    def interleave(job_lists):
+        """
+        Merge per-station job lists round robin.
+
+        Parameters:
+        - job_lists (list): One list of jobs per station.
+
+        Returns:
+        - generator: Jobs taking one from each station in turn, so a long backlog
+        cant starve the stations queued behind it.
+        """
+        iterators = deque(iter(jobs) for jobs in job_lists)
+        while iterators:
+            jobs = iterators.popleft()
+            job = next(jobs, None)
+            if job is not None:
+                yield job
+                iterators.append(jobs)
+
+    def run(self, consumer, start_year_override=None):
+        """
+        Scrape every station.
+
+        Parameters:
+        - consumer (callable): Called as consumer(month_weather, (station_id, year, month))
+        from the worker threads as each month downloads, like WeatherScraper.stream_weather.
+        - start_year_override (int or None): Start every station at this year instead of
+        its earliest date.
+
+        Returns:
+        - dict: The [done, total] month counts for each station.
+
+        Description:
+        - The rate limiter is only installed on weather_scraper for the run, its
+        earlier limiter is put back afterwards.
+        """
+        guards = self.weather_scraper.guards
+        rate_limiter = guards.rate_limiter
+        guards.rate_limiter = self.rate_limiter
+        try:
+            bars = self.scrape_stations(consumer, start_year_override)
+        finally:
+            guards.rate_limiter = rate_limiter
+
+        for progress_bar in bars.values():
+            progress_bar.close()
+        return self.progress
+
+    def scrape_stations(self, consumer, start_year_override):
+        """
+        Look up every stations months and scrape them interleaved, see run.
+
+        Returns:
+        - dict: station id -> its progress bar.
+        """
+        parse_stage = self.weather_scraper.parse_stage(consumer)
+        with parse_stage, ThreadPoolExecutor(max_workers=self.workers) as executor:
+            job_lists = list(
+                executor.map(
+                    lambda station: self.station_months(station, start_year_override),
+                    self.station_ids,
+                )
+            )
+
+            bars = {}
+            for position, (station, jobs) in enumerate(zip(self.station_ids, job_lists)):
+                self.progress[station] = [0, len(jobs)]
+                bars[station] = tqdm(
+                    total=len(jobs), desc=f"Station {station}: ", position=position
+                )
+
+            # Keep a short window of jobs in flight so submission order stays fair.
+            pending = set()
+            for job in self.interleave(job_lists):
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self.record(done, bars)
+                pending.add(executor.submit(self.scrape_job, job, parse_stage.submit))
+            self.record(wait(pending).done, bars)
+        return bars
+
+    def scrape_job(self, job, page_consumer):
+        """Download one (station, year, month) job and hand the raw page to page_consumer."""
+        station_id, year, month = job
+        body = self.weather_scraper.download_month(year, month, station_id)
+        if body is not None:
+            page_consumer(body, job)
+        return station_id
+
+    def record(self, futures, bars):
+        """Count finished jobs towards their stations progress."""
+        for future in futures:
+            station_id = future.result()
+            self.progress[station_id][0] += 1
+            bars[station_id].update(1)
@@ -4,31 +4,105 @@
 # Karan brar - Documenation
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.request import urlopen
+from functools import partial
+from urllib.request import Request, urlopen
 from urllib.error import URLError, HTTPError
+from collections import namedtuple
 from contextlib import closing
 from html.parser import HTMLParser
 import re
 import logging
+import threading
+import time
+from http.client import HTTPException
 from lxml.html import parse
 from tqdm import tqdm
+from async_scraper import AsyncScraper
+from page_cache import PageCache
+from pipeline import ParseStage
+from retry import RequestGuards
+from table_parser import parse_daily_table
+
+# How a scraper downloads and parses, see WeatherScraper.set_engine.
+ScrapeSettings = namedtuple(
+    "ScrapeSettings", ["engine", "concurrency", "parse_workers", "parser"]
+)
 
 
 class WeatherScraper:
     """Scrapes environment Canada."""
 
-    def __init__(self):
-        """Instantiates the WeatherScraper class and initializes required attributes."""
+    ENGINES = ("threads", "asyncio")
+    PARSERS = ("lxml", "html")
+
+    # Seconds before a stalled request is given up on and retried.
+    TIMEOUT = 30
+
+    def __init__(
+        self,
+        engine="threads",
+        concurrency=8,
+        base_url="https://climate.weather.gc.ca/climate_data",
+        cache_dir="page_cache",
+        parser="lxml",
+    ):
+        """
+        Instantiates the WeatherScraper class and initializes required attributes.
+
+        Parameters:
+        - engine (str): "threads" for the thread pool, "asyncio" for pooled keep-alive connections.
+        - concurrency (int): Requests in flight at once, the download stage worker count.
+        - base_url (str): Root of the climate data site, point it at a local server for testing.
+        - cache_dir (str or None): Folder for the on-disk page cache, None turns caching off.
+        - parser (str): "lxml" for the fast table extractor, "html" for MyHTMLParser.
+        """
         super().__init__()
 
         self.weather_station_id = 27174
         self.url_sections = (
-            "https://climate.weather.gc.ca/climate_data",
+            base_url,
             f"/daily_data_e.html?StationID={self.weather_station_id}&StartYear=1840&Year=",
             "&Month=",
         )
 
         self.weather = {}
+        self.page_cache = PageCache(cache_dir) if cache_dir else None
+
+        if parser not in self.PARSERS:
+            raise ValueError(f"Unknown parser {parser}, expected one of {self.PARSERS}.")
+        # No parse worker processes to start with, pages parse on the download workers.
+        self.settings = ScrapeSettings(None, concurrency, 0, parser)
+        self.set_engine(engine, concurrency)
+
+        # The retry policy, circuit breaker, rate limiter and failure ledger requests go through.
+        self.guards = RequestGuards()
+
+    def set_engine(self, engine, concurrency=None, parse_workers=None):
+        """
+        Select how scrape_weather downloads and parses the months.
+
+        Parameters:
+        - engine (str): Either "threads" or "asyncio".
+        - concurrency (int or None): Requests in flight at once.
+        - parse_workers (int or None): Processes parsing pages, 0 to parse on the download workers.
+
+        Raises:
+        - ValueError: If the engine is not one of the supported engines, or a worker
+        count is out of range.
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown scraping engine {engine}, expected one of {self.ENGINES}.")
+
+        settings = self.settings._replace(engine=engine)
+        if concurrency is not None:
+            if int(concurrency) < 1:
+                raise ValueError("Concurrency must be at least 1.")
+            settings = settings._replace(concurrency=int(concurrency))
+        if parse_workers is not None:
+            if int(parse_workers) < 0:
+                raise ValueError("Parse workers cant be negative.")
+            settings = settings._replace(parse_workers=int(parse_workers))
+        self.settings = settings
 
     def scrape_weather(
         self,
@@ -48,80 +122,283 @@ class WeatherScraper:
         Description:
         - Scrapes weather data for each month from the earliest date or overridden
         start date to the current year.
-        - Utilizes multi-threading for efficient scraping with a progress bar.
+        - Collects the months from stream_weather into the master dictionary.
         """
-        try:
-            month_and_year = self.get_earliest_date()
-            start_year = start_year_override or month_and_year.get("Year")
-            start_month = start_month_override or month_and_year.get("Month")
-            start_year, start_month = (int(start_year), int(start_month))
-            end_year = datetime.now().year
-
-            total_tasks = (end_year - start_year + 1) * 12
-
-            # Tadgh Henry - Multithreading
-            # tqdm is used to provide a progress bad in the console.
-            with tqdm(
-                total=total_tasks, desc="Scraping: ", smoothing=0.1, miniters=1
-            ) as progress_bar:
-                with ThreadPoolExecutor() as executor:
-                    # An array for all our threads of months for all years.
-                    futures = [
-                        # Tells the thread what method to run and provides the parameters for it.
-                        executor.submit(self.scrape_weather_thread, year, month)
-                        for year in range(start_year, end_year + 1)
-                        for month in range(start_month if year == start_year else 1, 13)
-                    ]
-
-                    # Gets threads as they complete, 30 seconds total runtime.
-                    for _ in as_completed(futures):
-                        progress_bar.update(1)
+        lock = threading.Lock()
 
-            return self.weather
+        def collect(month_weather, _month_key):
+            with lock:
+                self.weather.update(month_weather)
+
+        if self.stream_weather(collect, start_year_override, start_month_override) is None:
+            return None
+        return self.weather
+
+    def stream_weather(
+        self,
+        consumer,
+        start_year_override=None,
+        start_month_override=None,
+    ):
+        """
+        Scrapes weather data, handing each month to consumer as soon as it is parsed.
+
+        Parameters:
+        - consumer (callable): Called as consumer(month_weather, (station_id, year, month))
+        for every month that downloaded, even one without any rows. Called from worker
+        threads when using the thread engine, a consumer that blocks slows the scrape down.
+        - start_year_override (int): Starting year to override scraping from the earliest date.
+        - start_month_override (int): Starting month to override scraping from the earliest date.
+
+        Returns:
+        - int or None: The number of months scraped, None if the start date couldnt be found.
+
+        Description:
+        - Nothing is kept in memory here, so the consumer decides what happens to each month.
+        """
+        try:
+            months = self.get_months(start_year_override, start_month_override)
         except URLError as error:
             logging.critical("URL or connection error occured %s", error)
             logging.warning(
                 "There was an issue grabbing the start date from the website title %s",
                 error,
             )
-        return None
+            return None
+
+        self.stream_months(months, consumer)
+        return len(months)
+
+    def stream_months(self, months, consumer):
+        """
+        Scrape exactly the given months, handing each to consumer as it is parsed.
+
+        Parameters:
+        - months (list): (year, month) tuples for the current station.
+        - consumer (callable): See stream_weather.
+
+        Description:
+        - Utilizes multi-threading, or the asyncio engine when selected, for efficient
+        scraping with a progress bar.
+        - Downloads and parsing are separate stages, see parse_stage, the progress bar
+        counts downloaded months.
+        """
+        # Tadgh Henry - Multithreading
+        # tqdm is used to provide a progress bad in the console.
+        with self.parse_stage(consumer) as parse_stage, tqdm(
+            total=len(months), desc="Scraping: ", smoothing=0.1, miniters=1
+        ) as progress_bar:
+            if self.settings.engine == "asyncio":
+                AsyncScraper(self, self.settings.concurrency).run(
+                    months, parse_stage.submit, progress_bar
+                )
+                return
+
+            with ThreadPoolExecutor(max_workers=self.settings.concurrency) as executor:
+                # An array for all our threads of months for all years.
+                futures = [
+                    # Tells the thread what method to run and provides the parameters for it.
+                    executor.submit(self.scrape_weather_thread, year, month, parse_stage.submit)
+                    for year, month in months
+                ]
+
+                # Gets threads as they complete, 30 seconds total runtime.
+                for _ in as_completed(futures):
+                    progress_bar.update(1)
+
+    def parse_stage(self, consumer):
+        """
+        Build the parse stage that turns downloaded pages into weather dicts.
+
+        Parameters:
+        - consumer (callable): Receives each parsed month, see stream_weather.
+
+        Returns:
+        - ParseStage: Use it as a context manager and hand it pages with its submit method.
+        """
+        return ParseStage(
+            partial(parse_pages, self.settings.parser), consumer, self.settings.parse_workers
+        )
+
+    def get_months(self, start_year_override=None, start_month_override=None):
+        """
+        List the (year, month) pairs to scrape.
+
+        Parameters:
+        - start_year_override (int): Starting year to override the earliest date.
+        - start_month_override (int): Starting month to override the earliest date.
+
+        Returns:
+        - list: (year, month) tuples from the start date through the end of the current year.
+
+        Raises:
+        - URLError: If the earliest date had to be looked up and the site couldnt be reached.
+        """
+        # Only ask the site for the earliest date when it wasnt handed to us.
+        month_and_year = {}
+        if not (start_year_override and start_month_override):
+            month_and_year = self.get_earliest_date()
+        start_year = start_year_override or month_and_year.get("Year")
+        start_month = start_month_override or month_and_year.get("Month")
+        start_year, start_month = (int(start_year), int(start_month))
+        end_year = datetime.now().year
+
+        return [
+            (year, month)
+            for year in range(start_year, end_year + 1)
+            for month in range(start_month if year == start_year else 1, 13)
+        ]
 
     # Tadgh Henry
-    def scrape_weather_thread(self, year, month):
+    def scrape_weather_thread(self, year, month, page_consumer):
         """
-        Thread function for scraping weather data for a specific year and month.
+        Thread function for downloading the weather page for a specific year and month.
 
         Parameters:
         - year (int): The year for which weather data is to be scraped.
         - month (int): The month for which weather data is to be scraped.
+        - page_consumer (callable): Receives the raw page and (station_id, year, month),
+        usually ParseStage.submit.
+
+        Description:
+        - Downloads the page for a specific year and month from Environment Canada.
+        - Failed months are logged and skipped.
+        """
+        body = self.download_month(year, month)
+
+        # Hand the raw page off, nothing is shared between threads here.
+        if body is not None:
+            page_consumer(body, (self.weather_station_id, year, month))
+
+    def download_month(self, year, month, station_id=None):
+        """
+        Download one months raw page.
+
+        Parameters:
+        - year (int): The year to download.
+        - month (int): The month to download.
+        - station_id (str or None): The station to download, defaults to the current station.
+
+        Returns:
+        - bytes or None: The page, None if the month couldnt be downloaded.
 
         Description:
-        - Scrapes weather data for a specific year and month from Environment Canada.
+        - Retryable failures are retried with jittered exponential backoff, and count
+        towards the circuit breaker shared by every worker.
+        - A month that still fails is logged and written to the failure ledger when one is set.
         """
+        station_id = station_id or self.weather_station_id
+        error = None
+        for attempt in range(self.guards.retry_policy.attempts):
+            # Hold back while the server is failing for everyone.
+            self.guards.circuit_breaker.wait()
+            try:
+                body = self.fetch_page(year, month, station_id)
+            except (URLError, HTTPException, TimeoutError, ConnectionError) as failure:
+                error = failure
+                if not self.guards.retry_policy.is_retryable(failure):
+                    break
+                self.guards.circuit_breaker.record_failure()
+                if attempt + 1 < self.guards.retry_policy.attempts:
+                    time.sleep(self.guards.retry_policy.delay(attempt))
+                continue
+
+            self.guards.circuit_breaker.record_success()
+            if self.guards.failure_ledger is not None:
+                self.guards.failure_ledger.resolve(station_id, year, month)
+            return body
+
+        logging.warning(
+            "We had issues scraping from the following url %s and the following error %s",
+            self.build_url(year, month, station_id),
+            error,
+        )
+        if self.guards.failure_ledger is not None:
+            self.guards.failure_ledger.record(station_id, year, month, error)
+        return None
+
+    def fetch_page(self, year, month, station_id=None):
+        """
+        Download one months daily data page, going through the page cache when enabled.
+
+        Parameters:
+        - year (int): The year of the page.
+        - month (int): The month of the page.
+        - station_id (str or None): The station of the page, defaults to the current station.
+
+        Returns:
+        - bytes: The raw page, decoding is left to the parse stage.
+
+        Raises:
+        - HTTPError, URLError: If the page couldnt be downloaded or revalidated.
+
+        Description:
+        - Closed historical months in the cache are returned without a network call.
+        - The current and previous months are revalidated with ETag/Last-Modified,
+        a 304 response serves the cached copy.
+        - Waits on the rate limiter, when one is set, before any network call.
+        """
+        station_id = station_id or self.weather_station_id
+        entry = self.cached_page(year, month, station_id)
+        if entry is not None and entry.final:
+            return entry.body
+
+        headers = self.page_cache.validators(entry) if self.page_cache else {}
+        request = Request(self.build_url(year, month, station_id), headers=headers)
         try:
-            parser = self.MyHTMLParser()
-            url = f"{self.url_sections[0]+self.url_sections[1]}{year}{self.url_sections[2]}{month}"
+            self.guards.wait_for_rate_limit()
 
             # Update URL for the current year and month and open the url
-            with closing(urlopen(url)) as response:
-                html_data = response.read().decode("utf-8")
-                parser.feed(html_data)
+            with closing(urlopen(request, timeout=self.TIMEOUT)) as response:
+                body = response.read()
+                self.store_page(year, month, body, response.headers, station_id)
+        except HTTPError as error:
+            if error.code == 304 and entry is not None:
+                self.page_cache.revalidated(station_id, year, month, entry)
+                return entry.body
+            raise
+        return body
+
+    def cached_page(self, year, month, station_id=None):
+        """Return the cache entry for a month, None on a miss or with caching off."""
+        if self.page_cache is None:
+            return None
+        return self.page_cache.get(station_id or self.weather_station_id, year, month)
 
-                # Update our master dictionary with the newly returned data
-                self.weather.update(parser.return_weather_dict())
-        except HTTPError as e:
-            logging.warning(
-                "We had issues scraping from the following url %s and the following error %s",
-                url,
-                e,
-            )
-        except URLError as error:
-            logging.warning(
-                "We had issues scraping from the following url %s and the following error %s",
-                url,
-                error,
+    def store_page(self, year, month, body, headers, station_id=None):
+        """Save a downloaded page and its validators to the cache when enabled."""
+        if self.page_cache is not None:
+            self.page_cache.put(
+                station_id or self.weather_station_id, year, month, body, headers
             )
 
+    def station_url_sections(self, station_id):
+        """Return the url sections for a station, see url_sections."""
+        return (
+            self.url_sections[0],
+            f"/daily_data_e.html?StationID={station_id}&StartYear=1840&Year=",
+            "&Month=",
+        )
+
+    def build_url(self, year, month, station_id=None):
+        """Return the daily data url for the given year, month and station."""
+        sections = (
+            self.station_url_sections(station_id) if station_id else self.url_sections
+        )
+        return f"{sections[0]+sections[1]}{year}{sections[2]}{month}"
+
+    def parse_page(self, html_data):
+        """
+        Parse one months daily data page.
+
+        Parameters:
+        - html_data (bytes or str): A daily data page, raw or decoded.
+
+        Returns:
+        - dict: Weather data keyed by date.
+        """
+        return parse_pages(self.settings.parser, [html_data])[0]
+
     # Tadgh Henry
     def change_weather_station(self, new_station_id):
         """
@@ -137,17 +414,15 @@ class WeatherScraper:
             raise TypeError
 
         self.weather_station_id = new_station_id
-        self.url_sections = (
-            "https://climate.weather.gc.ca/climate_data",
-            f"/daily_data_e.html?StationID={self.weather_station_id}&StartYear=1840&Year=",
-            "&Month=",
-        )
+        self.url_sections = self.station_url_sections(self.weather_station_id)
 
     # Tadgh Henry
-    def get_earliest_date(self):
+    def get_earliest_date(self, station_id=None):
         """
         Retrieve the earliest year and month for the current weather station.
 
+        Parameters:
+        - station_id (str or None): Look up this station instead of the current one.
 
         Returns:
         - dict or None: A dictionary with integers representing the earliest month and year.
@@ -186,7 +461,11 @@ class WeatherScraper:
 
             return None
 
-        with urlopen(self.url_sections[0] + self.url_sections[1] + "1840") as page:
+        sections = (
+            self.station_url_sections(station_id) if station_id else self.url_sections
+        )
+        self.guards.wait_for_rate_limit()
+        with urlopen(sections[0] + sections[1] + "1840", timeout=self.TIMEOUT) as page:
             p = parse(page)
         return extract_month_and_date((p.find(".//title").text))
 
@@ -356,3 +635,31 @@ class WeatherScraper:
                 return True
             except ValueError:
                 return False
+
+
+def parse_pages(parser, pages):
+    """
+    Parse a batch of daily data pages.
+
+    Parameters:
+    - parser (str): "lxml" or "html", see WeatherScraper.PARSERS.
+    - pages (list): Raw or decoded daily data pages.
+
+    Returns:
+    - list: One weather dict per page, in the same order.
+
+    Description:
+    - Module level so the parse stage can run it in worker processes.
+    """
+    results = []
+    for html_data in pages:
+        if isinstance(html_data, bytes):
+            html_data = html_data.decode("utf-8")
+
+        if parser == "lxml":
+            results.append(parse_daily_table(html_data))
+        else:
+            html_parser = WeatherScraper.MyHTMLParser()
+            html_parser.feed(html_data)
+            results.append(html_parser.return_weather_dict())
+    return results
@@ -0,0 +1,117 @@
+"""Database side of the stations table."""
+
+import logging
+import sqlite3
+
+
+class StationsMixin:
+    """Reads and writes the stations table, mixed into DBOperations."""
+
+    def get_station(self, station_id):
+        """
+        Look up a stations saved metadata.
+
+        Returns:
+        - dict or None: The stations 'name', 'province', 'latitude' and 'longitude', the
+        'first' and 'last' available (year, month) and the 'dates' of its oldest and newest
+        saved day. 'first' is None until it has been looked up on the site, 'last' and the
+        'dates' are None before anything is saved. None if the station isnt known.
+        """
+        if not str(station_id).isdigit():
+            raise ValueError("station_id must be digits.")
+
+        rows = self.get_query_data(
+            "SELECT name, province, latitude, longitude, first_year, first_month, "
+            "first_date, last_date, "
+            "(SELECT year * 100 + month FROM coverage "
+            f"WHERE station_id = '{station_id}' AND days > 0 "
+            "ORDER BY year DESC, month DESC LIMIT 1) "
+            f"FROM stations WHERE station_id = '{station_id}'"
+        )
+        if not rows:
+            return None
+
+        name, province, latitude, longitude, first_year, first_month, *dates, last = rows[0]
+        return {
+            "name": name,
+            "province": province,
+            "latitude": latitude,
+            "longitude": longitude,
+            "first": None if first_year is None else (first_year, first_month),
+            "last": None if last is None else divmod(last, 100),
+            "dates": None if dates[0] is None else tuple(dates),
+        }
+
+    def get_stations(self):
+        """
+        List every station in the database.
+
+        Returns:
+        - list or None: (station_id, name, province, first_date, last_date) tuples,
+        None if the query failed.
+        """
+        return self.get_query_data(
+            "SELECT station_id, name, province, first_date, last_date "
+            "FROM stations ORDER BY station_id"
+        )
+
+    def save_station(self, station_id, first_year=None, first_month=None, **details):
+        """
+        Save what is known about a station, details left out keep their saved values.
+
+        Parameters:
+        - station_id (str or int): The station.
+        - first_year (int or None): The first year the station has data for.
+        - first_month (int or None): The first month of first_year with data.
+        - details: Any of 'name', 'province', 'latitude' and 'longitude'.
+        """
+        unknown = set(details) - {"name", "province", "latitude", "longitude"}
+        if unknown:
+            raise ValueError(f"Unknown station details {sorted(unknown)}.")
+
+        try:
+            with self.database_context as cursor:
+                cursor.execute(
+                    """INSERT INTO stations
+                    (station_id, name, province, latitude, longitude, first_year, first_month)
+                    VALUES (:station_id, :name, :province, :latitude, :longitude,
+                    :first_year, :first_month)
+                    ON CONFLICT (station_id) DO UPDATE SET
+                    name = COALESCE(excluded.name, name),
+                    province = COALESCE(excluded.province, province),
+                    latitude = COALESCE(excluded.latitude, latitude),
+                    longitude = COALESCE(excluded.longitude, longitude),
+                    first_year = COALESCE(excluded.first_year, first_year),
+                    first_month = COALESCE(excluded.first_month, first_month),
+                    updated = CURRENT_TIMESTAMP""",
+                    {
+                        "name": None,
+                        "province": None,
+                        "latitude": None,
+                        "longitude": None,
+                        **details,
+                        "station_id": str(station_id),
+                        "first_year": None if first_year is None else int(first_year),
+                        "first_month": None if first_month is None else int(first_month),
+                    },
+                )
+        except sqlite3.OperationalError as error:
+            logging.warning("Couldnt save station %s: %s", station_id, error)
+
+    def purge_station(self, station_id):
+        """Delete one stations weather, coverage and failed months."""
+        if not str(station_id).isdigit():
+            raise ValueError("station_id must be digits.")
+
+        try:
+            with self.database_context as cursor:
+                for table in ("weather", "coverage", "failed_months"):
+                    cursor.execute(f"DELETE FROM {table} WHERE station_id = ?", (str(station_id),))
+                cursor.execute(
+                    "UPDATE stations SET first_date = NULL, last_date = NULL WHERE station_id = ?",
+                    (str(station_id),),
+                )
+                logging.info("Data deleted for station %s.", station_id)
+            self.query_cache.bump()
+        except sqlite3.OperationalError as error:
+            logging.critical("purge_station couldnt purge station %s: %s", station_id, error)
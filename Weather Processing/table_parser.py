@@ -0,0 +1,124 @@
+"""Fast lxml extractor for the daily data table."""
+
+import calendar
+import re
+from lxml import etree
+from lxml.html import document_fromstring
+
+# 'Month Day, Year' as found in the row header abbr titles, matching exactly what
+# datetime.strptime(title, "%B %d, %Y") accepts.
+DATE_TITLE = re.compile(
+    r"(january|february|march|april|may|june|july|august|september|october|november"
+    r"|december)\s+(3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9]),\s+(\d\d\d\d)",
+    re.IGNORECASE,
+)
+# The usual readings, anything else a float() accepts is checked the slow way.
+NUMBER = re.compile(r"\s*[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?\s*")
+
+MONTH_NUMBERS = {
+    name.lower(): number for number, name in enumerate(calendar.month_name) if name
+}
+
+# Reading index -> the reading it is, like MyHTMLParser.column_temperature_legend.
+COLUMN_LEGEND = {0: "Max", 1: "Min", 2: "Mean"}
+
+# Every tag start and end, plus comments and processing instructions for their tails.
+WALK_EVENTS = ("start", "end", "comment", "pi")
+
+
+def convert_title(title):
+    """
+    Convert a 'Month Day, Year' title to 'YYYY-MM-DD'.
+
+    Parameters:
+    - title (str): The abbr title from a row header.
+
+    Returns:
+    - str or None: The formatted date, None if the title isnt a valid date.
+    """
+    match = DATE_TITLE.fullmatch(title)
+    if match is None:
+        return None
+
+    month = MONTH_NUMBERS[match.group(1).lower()]
+    year, day = int(match.group(3)), int(match.group(2))
+    if year < 1 or day > calendar.monthrange(year, month)[1]:
+        return None
+    # strftime doesnt pad years before 1000 either.
+    return f"{year}-{month:02d}-{day:02d}"
+
+
+def is_float(text):
+    """Check if text converts to a float, trying the regex before float() itself."""
+    if NUMBER.fullmatch(text):
+        return True
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_daily_table(html_data):
+    """
+    Extract the Max, Min and Mean temperatures for every day in a daily data page.
+
+    Parameters:
+    - html_data (str): The decoded html of a daily data page.
+
+    Returns:
+    - dict: Weather data keyed by 'YYYY-MM-DD', the same output as WeatherScraper.MyHTMLParser.
+
+    Description:
+    - lxml builds the tree in C, then one walk over it feeds MyHTMLParser's state
+    machine the same start tags and text it sees, so the results match on any page,
+    including its quirks:
+        - A bare 'M' cell after the Mean counts as a fourth reading and no later row
+        is saved.
+        - A row without any readings leaves the next rows day number read as a
+        temperature.
+    - Dates are read with a precompiled regex and month lookup instead of strptime,
+    and cells are checked with a regex before falling back to float().
+    """
+    weather = {}
+    if not html_data.strip():
+        return weather
+
+    # MyHTMLParser's flags, see handle_starttag and handle_data there.
+    table_start = row = header = data = False
+    index = 0
+    temperatures = {}
+    row_date = None
+    for event, element in etree.iterwalk(document_fromstring(html_data), events=WALK_EVENTS):
+        if event == "start":
+            tag = element.tag
+            if tag == "tbody":
+                table_start = True
+            elif table_start == (tag == "tr"):
+                row = True
+            elif row and tag == "td":
+                data = True
+            elif not data and tag == "th":
+                header = "row" in element.get("scope", "")
+            elif header and tag == "abbr":
+                title = element.get("title")
+                row_date = (title is not None and convert_title(title)) or row_date
+                header = False
+            text = element.text
+        else:
+            # Text after an end tag, comment or processing instruction.
+            text = element.tail
+
+        if not (data and text) or text == "Sum":
+            continue
+        if index < 3 and is_float(text) or text == "M":
+            temperatures[COLUMN_LEGEND.get(index)] = text
+            index += 1
+            data = False
+        elif index == 3:
+            weather[row_date] = temperatures
+            row = header = data = False
+            temperatures = {}
+            index = 0
+
+    return weather
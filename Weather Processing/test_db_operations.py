@@ -0,0 +1,288 @@
+"""Checks DBOperations against throwaway databases, run with: python -m unittest"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from db_operations import DBOperations
+
+# The schema and rows databases were made with before MIGRATIONS existed.
+BASELINE_SCHEMA = (
+    """CREATE TABLE weather (
+    id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    sample_date TEXT NOT NULL,
+    location TEXT NOT NULL,
+    min_temp REAL NOT NULL,
+    max_temp REAL NOT NULL,
+    avg_temp REAL NOT NULL
+    )""",
+    "CREATE INDEX idx_sample_date ON weather (sample_date)",
+)
+BASELINE_ROWS = (
+    ("2020-01-01", -2.0, 1.0, -0.5),
+    # Saved twice, the newer copy is kept.
+    ("2020-01-01", -3.0, 2.0, -0.5),
+    ("2020-01-02", -2.5, 1.5, "M"),
+    ("2020-01-03", "M", "M", "M"),
+    ("2020-02-01", -9.0, -3.0, -6.0),
+)
+
+DAYS = {
+    "2020-01-01": {"Max": "1.0", "Min": "-2.0", "Mean": "-0.5"},
+    "2020-01-02": {"Max": "1.5", "Min": "-2.5", "Mean": "-0.5"},
+    "2020-02-01": {"Max": "-3.0", "Min": "-9.0", "Mean": "-6.0"},
+}
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Runs each test in its own folder, so each gets a new weather_data.sqlite."""
+
+    def setUp(self):
+        """Move into an empty folder and forget any schema set up by earlier tests."""
+        self.folder = tempfile.mkdtemp()
+        self.previous_folder = os.getcwd()
+        os.chdir(self.folder)
+        DBOperations.schema_ready.clear()
+        self.weather_db = DBOperations()
+
+    def tearDown(self):
+        """Close this threads connection before its folder is removed."""
+        self.weather_db.connection_manager.close()
+        DBOperations.schema_ready.clear()
+        os.chdir(self.previous_folder)
+        shutil.rmtree(self.folder)
+
+    def weather_rows(self):
+        """Return every weather row as (id, sample_date, min, max, mean), in date order."""
+        return self.weather_db.get_query_data(
+            "SELECT id, sample_date, min_temp, max_temp, avg_temp FROM weather "
+            "ORDER BY sample_date"
+        )
+
+
+class TestSaveData(DatabaseTestCase):
+    """save_data upserts days in one batch."""
+
+    def test_upsert_is_idempotent(self):
+        """Saving the same days twice leaves the same rows, ids included."""
+        self.assertTrue(self.weather_db.save_data(DAYS))
+        first = self.weather_rows()
+        self.assertTrue(self.weather_db.save_data(DAYS))
+        self.assertEqual(self.weather_rows(), first)
+        self.assertEqual(
+            [row[1:] for row in first],
+            [
+                ("2020-01-01", -2.0, 1.0, -0.5),
+                ("2020-01-02", -2.5, 1.5, -0.5),
+                ("2020-02-01", -9.0, -3.0, -6.0),
+            ],
+        )
+
+    def test_revised_values_win(self):
+        """A day saved again is overwritten in place rather than duplicated."""
+        self.weather_db.save_data(DAYS)
+        before = self.weather_rows()
+        self.weather_db.save_data({"2020-01-02": {"Max": "4.0", "Min": "-1.0", "Mean": "1.5"}})
+        after = self.weather_rows()
+        self.assertEqual(len(after), len(DAYS))
+        self.assertEqual(after[1], (before[1][0], "2020-01-02", -1.0, 4.0, 1.5))
+        self.assertEqual(after[0], before[0])
+
+    def test_pairs_from_a_generator(self):
+        """Any iterable of (date, values) pairs is saved like a dict."""
+        self.assertTrue(self.weather_db.save_data(day for day in DAYS.items()))
+        self.assertEqual(len(self.weather_rows()), len(DAYS))
+
+    def test_bad_input_saves_nothing(self):
+        """One malformed day stops the whole batch before anything is written."""
+        days = [*DAYS.items(), ("2020-13-01", {"Max": "1", "Min": "0", "Mean": "0.5"})]
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(self.weather_db.save_data(days))
+            self.assertFalse(self.weather_db.save_data([("2020-01-01", "1.0")]))
+        self.assertEqual(self.weather_rows(), [])
+
+
+
+class TestMigrations(DatabaseTestCase):
+    """A database from before MIGRATIONS is brought up to the current schema."""
+
+    def setUp(self):
+        """Write a baseline database for DBOperations to open."""
+        super().setUp()
+        conn = sqlite3.connect("weather_data.sqlite")
+        with conn:
+            for statement in BASELINE_SCHEMA:
+                conn.execute(statement)
+            conn.executemany(
+                "INSERT INTO weather (sample_date, location, min_temp, max_temp, avg_temp) "
+                "VALUES (?, 'Winnipeg, MB', ?, ?, ?)",
+                BASELINE_ROWS,
+            )
+        conn.close()
+
+    def test_baseline_is_migrated(self):
+        """Every migration runs once and the rows keep their dates and readings."""
+        self.assertEqual(
+            self.weather_db.get_query_data("PRAGMA user_version"),
+            [(len(DBOperations.MIGRATIONS),)],
+        )
+        self.assertEqual(
+            self.weather_db.get_query_data(
+                "SELECT sample_date, station_id, year, month, day, min_temp, max_temp "
+                "FROM weather ORDER BY sample_date"
+            ),
+            [
+                ("2020-01-01", "27174", 2020, 1, 1, -3.0, 2.0),
+                ("2020-01-02", "27174", 2020, 1, 2, -2.5, 1.5),
+                ("2020-01-03", "27174", 2020, 1, 3, None, None),
+                ("2020-02-01", "27174", 2020, 2, 1, -9.0, -3.0),
+            ],
+        )
+        self.assertEqual(
+            self.weather_db.get_query_data(
+                "SELECT station_id, name, province, first_date, last_date FROM stations"
+            ),
+            [("27174", "Winnipeg", "MB", "2020-01-01", "2020-02-01")],
+        )
+        indexes = {
+            row[0]
+            for row in self.weather_db.get_query_data(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'weather'"
+            )
+        }
+        self.assertIn("idx_station_sample_date", indexes)
+        self.assertIn("idx_station_year_month_day", indexes)
+        self.assertNotIn("idx_sample_date", indexes)
+
+    def test_migrations_run_once(self):
+        """Opening a migrated database again leaves it as it was."""
+        before = self.weather_rows()
+        self.weather_db.connection_manager.close()
+        DBOperations.schema_ready.clear()
+        self.assertEqual(self.weather_rows(), before)
+        self.assertEqual(
+            self.weather_db.get_query_data("PRAGMA user_version"),
+            [(len(DBOperations.MIGRATIONS),)],
+        )
+        # The upsert the first migration made possible replaces the migrated day.
+        self.weather_db.save_data({"2020-01-01": {"Max": "5", "Min": "0", "Mean": "2.5"}})
+        self.assertEqual(len(self.weather_rows()), len(before))
+
+    def test_missing_text_becomes_null(self):
+        """'M' text left in REAL columns is nulled and recorded in the quality bits."""
+        self.assertEqual(
+            self.weather_db.get_query_data(
+                "SELECT sample_date, avg_temp, quality FROM weather ORDER BY sample_date"
+            ),
+            [
+                ("2020-01-01", -0.5, 0),
+                ("2020-01-02", None, 16),
+                ("2020-01-03", None, 21),
+                ("2020-02-01", -6.0, 0),
+            ],
+        )
+
+
+class TestQuality(DatabaseTestCase):
+    """Missing readings are stored as null with their quality bits set."""
+
+    def test_partly_missing_day(self):
+        """Only the missing reading is null, and only its missing bit is set."""
+        self.weather_db.save_data({"2020-01-01": {"Max": "1.0", "Min": "-2.0", "Mean": "M"}})
+        self.assertEqual(
+            self.weather_db.get_query_data(
+                "SELECT min_temp, max_temp, avg_temp, quality FROM weather"
+            ),
+            [(-2.0, 1.0, None, DBOperations.QUALITY_MISSING << 4)],
+        )
+
+    def test_fully_missing_day(self):
+        """A day with no readings keeps its row, every reading null and marked missing."""
+        self.weather_db.save_data({"2020-01-01": {"Max": "M", "Min": "", "Mean": None}})
+        missing = sum(DBOperations.QUALITY_MISSING << shift for shift in (0, 2, 4))
+        self.assertEqual(
+            self.weather_db.get_query_data(
+                "SELECT min_temp, max_temp, avg_temp, quality FROM weather"
+            ),
+            [(None, None, None, missing)],
+        )
+
+    def test_flagged_reading(self):
+        """A flagged reading keeps its value with the flagged bit set."""
+        self.weather_db.save_data(
+            {"2020-01-01": {"Max": "1.0", "Min": "-2.0", "Mean": "-0.5", "Flags": {"Max": "E"}}}
+        )
+        self.assertEqual(
+            self.weather_db.get_query_data("SELECT max_temp, quality FROM weather"),
+            [(1.0, DBOperations.QUALITY_FLAGGED << 2)],
+        )
+
+    def test_quality_days(self):
+        """get_quality_days lists only the days with a missing or flagged reading."""
+        self.weather_db.save_data(
+            {
+                **DAYS,
+                "2020-01-05": {"Max": "1.0", "Min": "M", "Mean": "0.5"},
+                "2021-01-05": {"Max": "M", "Min": "M", "Mean": "M"},
+            }
+        )
+        self.assertEqual(
+            self.weather_db.get_quality_days("27174"), [("2020-01-05", 1), ("2021-01-05", 21)]
+        )
+        self.assertEqual(
+            self.weather_db.get_quality_days("27174", end_year="2020"), [("2020-01-05", 1)]
+        )
+
+
+class TestDateQueries(DatabaseTestCase):
+    """Date filtered queries are range scans of a station index, not table scans."""
+
+    def query_plan(self, fetch, *args, **kwargs):
+        """Run fetch, returning the query plan of the sql it ran."""
+        queries = []
+        run_query = self.weather_db.get_cached_query_data
+
+        def record(sql_query, *query_args, **query_kwargs):
+            queries.append(sql_query)
+            return run_query(sql_query, *query_args, **query_kwargs)
+
+        with mock.patch.object(self.weather_db, "get_cached_query_data", record):
+            fetch(*args, **kwargs)
+        self.assertEqual(len(queries), 1)
+        return " ".join(
+            row[-1]
+            for row in self.weather_db.get_query_data(f"EXPLAIN QUERY PLAN {queries[0]}")
+        )
+
+    def test_year_month_uses_index(self):
+        """The line plots month is a search of the station, year and month index."""
+        self.weather_db.save_data(DAYS)
+        self.assertEqual(
+            self.weather_db.fetch_year_month_average("2020", "1"),
+            [("2020-01-01", -0.5), ("2020-01-02", -0.5)],
+        )
+        plan = self.query_plan(self.weather_db.fetch_year_month_average, "2020", "1")
+        self.assertIn("idx_station_year_month_day", plan)
+        self.assertNotIn("SCAN weather", plan)
+
+    def test_date_range_uses_index(self):
+        """A date range is a search of the station and sample_date index."""
+        self.weather_db.save_data(DAYS)
+        columns = self.weather_db.fetch_daily_columns(
+            start_date="2020-01-02", end_date="2020-02-01"
+        )
+        self.assertEqual(columns["max"].tolist(), [1.5, -3.0])
+        plan = self.query_plan(
+            self.weather_db.fetch_daily_columns,
+            start_date="2020-01-02",
+            end_date="2020-02-01",
+        )
+        self.assertIn("idx_station_sample_date", plan)
+        self.assertNotIn("SCAN weather", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Checks the range plot downsampling, run with: python -m unittest"""
+
+import math
+import unittest
+
+import numpy as np
+
+from plot_operations import PlotOperations
+
+
+def reference_lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets one bucket at a time, as first published."""
+    length = len(x)
+    if threshold < 3 or length <= threshold:
+        return list(range(length))
+
+    every = (length - 2) / (threshold - 2)
+    kept = [0]
+    previous = 0
+    for bucket in range(threshold - 2):
+        next_start = math.floor((bucket + 1) * every) + 1
+        next_end = min(math.floor((bucket + 2) * every) + 1, length)
+        average_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        average_y = sum(y[next_start:next_end]) / (next_end - next_start)
+
+        # max keeps the first of equal areas, like argmax.
+        previous = max(
+            range(math.floor(bucket * every) + 1, next_start),
+            key=lambda index, start=previous, ax=average_x, ay=average_y: abs(
+                (x[start] - ax) * (y[index] - y[start])
+                - (x[start] - x[index]) * (ay - y[start])
+            ),
+        )
+        kept.append(previous)
+    kept.append(length - 1)
+    return kept
+
+
+class TestLargestTriangleThreeBuckets(unittest.TestCase):
+    """largest_triangle_three_buckets keeps the points the one bucket at a time loop does."""
+
+    def test_matches_reference(self):
+        """Every threshold picks the same points as the reference loop."""
+        generator = np.random.default_rng(0)
+        for length, threshold in ((10, 5), (365, 50), (1000, 3), (5000, 777), (999, 998)):
+            x = np.arange(length, dtype=np.float64)
+            y = np.cumsum(generator.normal(size=length))
+            with self.subTest(length=length, threshold=threshold):
+                kept = PlotOperations.largest_triangle_three_buckets(x, y, threshold)
+                self.assertEqual(kept.tolist(), reference_lttb(x, y, threshold))
+
+    def test_short_series_is_kept_whole(self):
+        """A line with no more points than the threshold isnt downsampled."""
+        x = np.arange(20, dtype=np.float64)
+        kept = PlotOperations.largest_triangle_three_buckets(x, np.sin(x), 20)
+        self.assertEqual(kept.tolist(), list(range(20)))
+
+    def test_keeps_the_peak(self):
+        """A lone spike survives downsampling."""
+        x = np.arange(2000, dtype=np.float64)
+        y = np.zeros(2000)
+        y[1234] = 40.0
+        kept = PlotOperations.largest_triangle_three_buckets(x, y, 100)
+        self.assertIn(1234, kept.tolist())
+        self.assertEqual(len(kept), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
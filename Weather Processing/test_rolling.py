@@ -0,0 +1,57 @@
+"""Checks the rolling window statistics, run with: python -m unittest"""
+
+import math
+import unittest
+
+import numpy as np
+
+from rolling import RollingStatistics
+
+
+def reference_window(values, window, min_fraction):
+    """Mean, min and max of each trailing window with plain loops, NaN without enough days."""
+    needed = max(1, math.ceil(window * min_fraction))
+    results = {"mean": [], "min": [], "max": []}
+    for end in range(len(values)):
+        present = [
+            value for value in values[max(0, end - window + 1) : end + 1] if not math.isnan(value)
+        ]
+        enough = len(present) >= needed
+        results["mean"].append(sum(present) / len(present) if enough else math.nan)
+        results["min"].append(min(present) if enough else math.nan)
+        results["max"].append(max(present) if enough else math.nan)
+    return results
+
+
+class TestRollingStatistics(unittest.TestCase):
+    """window_statistics matches a window by window loop."""
+
+    def setUp(self):
+        """An engine that never needs the database."""
+        self.statistics = RollingStatistics(weather_db=object(), min_fraction=0.8)
+
+    def test_matches_reference(self):
+        """Means, minimums and maximums agree for every window, gaps included."""
+        generator = np.random.default_rng(0)
+        values = generator.normal(size=400) * 10
+        values[generator.random(400) < 0.15] = np.nan
+        values[100:140] = np.nan
+        for window in (1, 7, 30, 365):
+            expected = reference_window(values.tolist(), window, 0.8)
+            result = self.statistics.window_statistics(values, window)
+            for name in ("mean", "min", "max"):
+                with self.subTest(window=window, statistic=name):
+                    np.testing.assert_allclose(result[name], expected[name], equal_nan=True)
+
+    def test_daily_axis_fills_gaps(self):
+        """Days missing from the record become NaN days, so windows count calendar days."""
+        days = np.array(["2020-02-27", "2020-03-01"], dtype="datetime64[D]")
+        axis, values = RollingStatistics.daily_axis(days, np.array([1.0, 2.0]))
+        self.assertEqual(
+            axis.tolist(), np.arange("2020-02-27", "2020-03-02", dtype="datetime64[D]").tolist()
+        )
+        np.testing.assert_array_equal(values, [1.0, np.nan, np.nan, 2.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
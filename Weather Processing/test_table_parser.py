@@ -0,0 +1,104 @@
+"""Checks the lxml table extractor against MyHTMLParser, run with: python -m unittest"""
+
+import glob
+import os
+import unittest
+
+from replay_server import synthetic_page
+from scrape_weather import WeatherScraper
+from table_parser import parse_daily_table
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def daily_page(rows):
+    """Wrap (day, cells) rows in a January 2020 daily data table, cells split by newlines."""
+    body = "\n".join(
+        '<tr>\n<th scope="row"><abbr title="January '
+        f'{day}, 2020">{day:02d}</abbr></th>\n'
+        + "\n".join(f"<td>{cell}</td>" for cell in cells)
+        + "\n</tr>"
+        for day, cells in rows
+    )
+    return (
+        "<html><body><table><thead><tr><th>DAY</th></tr></thead>\n"
+        f"<tbody>\n{body}\n</tbody></table></body></html>"
+    )
+
+
+class TestParseDailyTable(unittest.TestCase):
+    """parse_daily_table should read pages the way MyHTMLParser does."""
+
+    def setUp(self):
+        """Create the scraper whose MyHTMLParser the results are compared with."""
+        self.scraper = WeatherScraper(cache_dir=None, parser="html")
+
+    def test_fixtures_match_html_parser(self):
+        """Every saved page gives the same days and readings from both parsers."""
+        paths = sorted(glob.glob(os.path.join(FIXTURES, "*.html")))
+        self.assertTrue(paths, "No fixture pages found.")
+        for path in paths:
+            with open(path, encoding="utf-8") as page_file:
+                html_data = page_file.read()
+            with self.subTest(page=os.path.basename(path)):
+                weather = parse_daily_table(html_data)
+                self.assertTrue(weather)
+                self.assertEqual(weather, self.scraper.parse_page(html_data))
+
+    def test_missing_mean(self):
+        """A missing Mean is kept as 'M' text, as MyHTMLParser keeps it."""
+        html_data = daily_page(
+            [(1, ["1.0", "-2.0", "M", "4", "5"]), (2, ["1.5", "-2.5", "M", "4"])]
+        )
+        self.assertEqual(
+            parse_daily_table(html_data),
+            {
+                "2020-01-01": {"Max": "1.0", "Min": "-2.0", "Mean": "M"},
+                "2020-01-02": {"Max": "1.5", "Min": "-2.5", "Mean": "M"},
+            },
+        )
+        self.assertEqual(parse_daily_table(html_data), self.scraper.parse_page(html_data))
+
+    def test_missing_after_mean(self):
+        """
+        A bare 'M' after the Mean is read as MyHTMLParser reads it.
+
+        It counts as a fourth reading, so that row and every later one are never saved.
+        """
+        html_data = daily_page(
+            [(1, ["1.0", "-2.0", "-0.5", "M", "5"]), (2, ["1.5", "-2.5", "-0.5", "M"])]
+        )
+        self.assertEqual(parse_daily_table(html_data), {})
+        self.assertEqual(parse_daily_table(html_data), self.scraper.parse_page(html_data))
+
+    def test_blank_rows(self):
+        """
+        Days without any readings are read as MyHTMLParser reads them.
+
+        The blank row leaves the next rows day number read as its first temperature.
+        """
+        html_data = daily_page(
+            [(1, ["1.0", "-2.0", "-0.5", "4"])]
+            + [(day, ["&nbsp;"] * 4) for day in range(2, 6)]
+        )
+        self.assertEqual(
+            parse_daily_table(html_data),
+            {
+                "2020-01-01": {"Max": "1.0", "Min": "-2.0", "Mean": "-0.5"},
+                "2020-01-02": {"Max": "03", "Min": "04", "Mean": "05"},
+            },
+        )
+        self.assertEqual(parse_daily_table(html_data), self.scraper.parse_page(html_data))
+
+    def test_synthetic_pages_match_html_parser(self):
+        """Replay server pages, with missing, blank and summary cells, read the same."""
+        for month in range(1, 13):
+            html_data = synthetic_page(2020, month, seed=month)
+            with self.subTest(month=month):
+                self.assertEqual(
+                    parse_daily_table(html_data), self.scraper.parse_page(html_data)
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
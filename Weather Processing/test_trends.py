@@ -0,0 +1,74 @@
+"""Checks the warming trend engine, run with: python -m unittest"""
+
+import unittest
+
+import numpy as np
+
+from trends import TrendAnalysis
+
+
+class TestTrendAnalysis(unittest.TestCase):
+    """The vectorized fits agree with NumPy's own least squares."""
+
+    def setUp(self):
+        """An analysis that never needs the database."""
+        self.analysis = TrendAnalysis(weather_db=object(), resamples=200, min_days=2)
+
+    def test_slopes_match_polyfit(self):
+        """Each column's slope is its least-squares fit, skipping NaN years."""
+        generator = np.random.default_rng(0)
+        years = np.arange(1950, 2000, dtype=np.float64)
+        table = 0.03 * (years[:, None] - 1950) + generator.normal(size=(50, 4))
+        table[generator.random((50, 4)) < 0.2] = np.nan
+
+        slopes = TrendAnalysis.slopes(np.ones((1, len(years))), years, table)[0]
+        for column in range(table.shape[1]):
+            present = ~np.isnan(table[:, column])
+            with self.subTest(column=column):
+                self.assertAlmostEqual(
+                    slopes[column], np.polyfit(years[present], table[present, column], 1)[0]
+                )
+
+    def test_too_few_years_is_nan(self):
+        """A column with fewer than three years has no trend."""
+        years = np.arange(2000, 2005, dtype=np.float64)
+        table = np.full((5, 1), np.nan)
+        table[:2, 0] = [1.0, 2.0]
+        self.assertTrue(np.isnan(TrendAnalysis.slopes(np.ones((1, 5)), years, table)[0, 0]))
+
+    def test_trend_interval_holds_the_slope(self):
+        """A clean warming line gives that slope per decade, inside its interval."""
+        years = np.arange(1900, 2000)
+        table = (0.02 * (years - 1900))[:, None] + np.zeros((1, 3))
+        result = self.analysis.trend(years, table)
+        np.testing.assert_allclose(result["slope"], 0.2)
+        self.assertTrue(np.all(result["low"] <= result["slope"] + 1e-9))
+        self.assertTrue(np.all(result["high"] >= result["slope"] - 1e-9))
+        self.assertEqual(result["years"].tolist(), [100, 100, 100])
+
+    def test_monthly_means_need_min_days(self):
+        """Months below min_days are NaN, the rest are their days' mean."""
+        days = np.array(
+            ["2000-01-01", "2000-01-02", "2000-02-01", "2001-01-05", "2001-01-06"],
+            dtype="datetime64[D]",
+        )
+        year, month, _ = TrendAnalysis.calendar_parts(days)
+        means = self.analysis.monthly_means(
+            year, month, np.array([1.0, 3.0, 5.0, 2.0, np.nan]), np.array([2000, 2001])
+        )
+        self.assertEqual(means.shape, (2, 12))
+        self.assertEqual(means[0, 0], 2.0)
+        self.assertTrue(np.isnan(means[0, 1]))
+        self.assertTrue(np.isnan(means[1, 0]))
+
+    def test_calendar_parts_line_up_leap_years(self):
+        """March 1st is the same day of year in leap and common years."""
+        days = np.array(["2019-03-01", "2020-03-01", "2020-02-29"], dtype="datetime64[D]")
+        year, month, day_of_year = TrendAnalysis.calendar_parts(days)
+        self.assertEqual(year.tolist(), [2019, 2020, 2020])
+        self.assertEqual(month.tolist(), [3, 3, 2])
+        self.assertEqual(day_of_year.tolist(), [60, 60, 59])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+"""Long term warming trends over a stations daily record, vectorized with NumPy."""
+
+import logging
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from db_operations import DBOperations
+
+# Start of each month in a 366 day calendar, so Feb 29 gets its own day of year
+# and every other day lines up across leap and common years.
+MONTH_OFFSETS = np.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335])
+
+
+class TrendAnalysis:
+    """Least-squares trends per calendar month and per day of year, with bootstrap intervals."""
+
+    def __init__(
+        self, weather_db=None, resamples=1000, confidence=0.95, min_days=20, seed=0
+    ):
+        """
+        Initialize the analysis.
+
+        Parameters:
+        - weather_db (DBOperations or None): Where the daily record is read from, a new
+        DBOperations if None.
+        - resamples (int): Bootstrap resamples behind each confidence interval.
+        - confidence (float): Coverage of the intervals, 0.95 gives the 2.5th to 97.5th
+        percentile of the resampled trends.
+        - min_days (int): Days a month needs before its mean counts towards the
+        monthly trends, so a month missing half its days doesnt skew them.
+        - seed (int): Seeds the resampling, so reruns give the same intervals.
+        """
+        self.weather_db = DBOperations() if weather_db is None else weather_db
+        self.resamples = resamples
+        self.confidence = confidence
+        self.min_days = min_days
+        self.seed = seed
+
+    @staticmethod
+    def calendar_parts(days):
+        """
+        Split datetime64[D] days into their year, month and day of year arrays.
+
+        Returns:
+        - tuple: (year, month, day_of_year) integer arrays, month is 1 to 12 and
+        day_of_year is 0 to 365 in the 366 day calendar of MONTH_OFFSETS.
+        """
+        months_since_epoch = days.astype("datetime64[M]")
+        year = days.astype("datetime64[Y]").astype(np.int64) + 1970
+        month = months_since_epoch.astype(np.int64) % 12 + 1
+        day = (days - months_since_epoch).astype(np.int64)
+        return year, month, MONTH_OFFSETS[month - 1] + day
+
+    @staticmethod
+    def slopes(weights, years, table):
+        """
+        Weighted least-squares slope of every column of table against years, skipping NaN.
+
+        Parameters:
+        - weights (numpy.ndarray): (fits, n years), how many times each year counts in
+        each fit. A row of ones is the plain fit, bootstrap rows are resample counts.
+        - years (numpy.ndarray): The n years.
+        - table (numpy.ndarray): (n years, columns), NaN where a year has no value.
+
+        Returns:
+        - numpy.ndarray: (fits, columns) slopes per year, NaN where a fit has fewer than
+        three distinct years with a value.
+
+        Description:
+        - Every fit of every column comes from five matrix products of the weights with
+        the tables sums, so thousands of fits cost about as much as one pass over it.
+        """
+        present = ~np.isnan(table)
+        mask = present.astype(np.float64)
+        values = np.where(present, table, 0.0)
+        # Centred so the squares stay small and the differences below stay exact.
+        x = years - years.mean()
+
+        count = weights @ mask
+        sum_x = (weights * x) @ mask
+        sum_xx = (weights * x * x) @ mask
+        sum_y = weights @ values
+        sum_xy = (weights * x) @ values
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = (count * sum_xy - sum_x * sum_y) / (count * sum_xx - sum_x * sum_x)
+        return np.where((weights > 0).astype(np.float64) @ mask >= 3, slope, np.nan)
+
+    def monthly_means(self, year, month, values, years):
+        """
+        Average daily values into a (years, 12) table of monthly means.
+
+        Description:
+        - One bincount over every day, months with fewer than min_days values are NaN.
+        """
+        present = ~np.isnan(values)
+        cells = (year[present] - years[0]) * 12 + month[present] - 1
+        size = len(years) * 12
+        totals = np.bincount(cells, weights=values[present], minlength=size)
+        counts = np.bincount(cells, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = totals / counts
+        means[counts < max(1, self.min_days)] = np.nan
+        return means.reshape(len(years), 12)
+
+    @staticmethod
+    def day_of_year_table(year, day_of_year, values, years):
+        """Place daily values into a (years, 366) table, days without a value are NaN."""
+        table = np.full((len(years), 366), np.nan)
+        table[year - years[0], day_of_year] = values
+        return table
+
+    def trend(self, years, table):
+        """
+        Fit the trend of every column of a (years, columns) table with a bootstrap interval.
+
+        Parameters:
+        - years (numpy.ndarray): The year of each table row.
+        - table (numpy.ndarray): Values per year and column, NaN where missing.
+
+        Returns:
+        - dict: 'slope', 'low' and 'high' in degrees per decade, and 'years', the years
+        with a value, per column.
+
+        Description:
+        - A resample draws the years with replacement, which is the same as weighting each
+        year by how often it was drawn, so every resample is fitted in one call to slopes.
+        """
+        years = years.astype(np.float64)
+        generator = np.random.default_rng(self.seed)
+        draws = generator.multinomial(
+            len(years), np.full(len(years), 1 / len(years)), size=self.resamples
+        )
+        resampled = self.slopes(draws.astype(np.float64), years, table)
+
+        tail = (1 - self.confidence) / 2 * 100
+        with warnings.catch_warnings():
+            # Columns without enough years are all NaN, their interval is NaN too.
+            warnings.simplefilter("ignore", RuntimeWarning)
+            low, high = np.nanpercentile(resampled, [tail, 100 - tail], axis=0)
+        return {
+            "slope": self.slopes(np.ones((1, len(years))), years, table)[0] * 10,
+            "low": low * 10,
+            "high": high * 10,
+            "years": (~np.isnan(table)).sum(axis=0),
+        }
+
+    def station_trends(self, station_id, reading="mean"):
+        """
+        Compute a stations warming trends.
+
+        Parameters:
+        - station_id (str or int): The station to analyse.
+        - reading (str): 'min', 'max' or 'mean' daily temperatures.
+
+        Returns:
+        - dict or None: 'station_id', the 'first_year' and 'last_year' analysed, and the
+        'month' (12 columns) and 'day' (366 columns, see MONTH_OFFSETS) trends from
+        TrendAnalysis.trend. None if the station has no data.
+
+        Description:
+        - The daily record is read in one columnar query, everything after that is NumPy.
+        """
+        columns = self.weather_db.fetch_daily_columns(station_id)
+        if columns is None or columns["day"].size == 0:
+            logging.info("No daily data to find trends in for station %s.", station_id)
+            return None
+
+        year, month, day_of_year = self.calendar_parts(columns["day"])
+        values = columns[reading]
+        years = np.arange(year[0], year[-1] + 1)
+        return {
+            "station_id": str(station_id),
+            "first_year": int(years[0]),
+            "last_year": int(years[-1]),
+            "month": self.trend(years, self.monthly_means(year, month, values, years)),
+            "day": self.trend(
+                years, self.day_of_year_table(year, day_of_year, values, years)
+            ),
+        }
+
+    def stations_trends(self, station_ids, reading="mean", workers=None):
+        """
+        Compute the trends of many stations in parallel.
+
+        Parameters:
+        - station_ids (iterable): The stations to analyse.
+        - reading (str): 'min', 'max' or 'mean' daily temperatures.
+        - workers (int or None): Processes to use, defaults to one per core.
+
+        Returns:
+        - dict: station_id -> station_trends result, stations without data are left out.
+
+        Description:
+        - Each worker process opens its own database connection and analyses whole
+        stations, only the small trend arrays come back.
+        """
+        settings = {
+            "resamples": self.resamples,
+            "confidence": self.confidence,
+            "min_days": self.min_days,
+            "seed": self.seed,
+        }
+        station_ids = [str(station_id) for station_id in station_ids]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                partial(analyse_station, settings, reading=reading), station_ids
+            )
+            return {
+                station_id: result
+                for station_id, result in zip(station_ids, results)
+                if result is not None
+            }
+
+
+def analyse_station(settings, station_id, reading="mean"):
+    """Process pool entry point, runs TrendAnalysis.station_trends in the worker."""
+    return TrendAnalysis(**settings).station_trends(station_id, reading)
@@ -4,11 +4,12 @@
 # Cole Cianflone - Documentation
 # Karan Brar - Testing
 import logging
+import multiprocessing
+import os
 import sys
 
 from menu import Menu
 
-from plot_operations import PlotOperations
 from actor import ScrapingActor
 
 logging.basicConfig(
@@ -24,9 +25,11 @@ class WeatherProcessor:
 
         Initializes class attributes including weather database connection,
         weather scraper, plot operations, year range, and latest dates.
+        The year range is read by the menus that use it, so the main menu opens
+        without querying the database. Plotting, trends and the scraper are
+        imported on first use for the same reason.
         """
 
-        self.plot_ops = PlotOperations()
         self.scraping_actor = ScrapingActor()
         self.latest_dates = None
 
@@ -34,7 +37,6 @@ class WeatherProcessor:
         self.range_max_key = None
         self.range_min_key = None
         self.latest_dates_string = None
-        self.update_range_info()
 
     def start_main(self):
         """Displays the main menu.
@@ -82,6 +84,9 @@ class WeatherProcessor:
         else:
             options.append(("Box plot", self.box_plot))
             options.append(("Line plot", self.line_plot))
+            options.append(("Line plot over dates", self.range_plot))
+            options.append(("Warming trends", self.show_trends))
+            options.append(("Export rolling averages CSV", self.export_rolling))
             options.append(
                 (
                     f"""Latest dates: {self.latest_dates_string}""",
@@ -108,6 +113,11 @@ class WeatherProcessor:
             [
                 ("Fetch data", actor.database_fetch),
                 ("Update current data", actor.database_update),
+                ("Retry failed months", actor.retry_failed_months),
+                ("Fill gaps in data", actor.gap_fill),
+                ("Fetch several stations", self.fetch_stations),
+                ("Refresh a range of months", self.refresh_range),
+                ("Load bulk data CSV folder", self.ingest_csv),
                 ("Reset data", actor.empty_database),
                 (
                     "Reset hard (Drop all tables, indexs)",
@@ -121,6 +131,47 @@ class WeatherProcessor:
         db_data_menu.set_prompt(">:")
         db_data_menu.open()
 
+    def ingest_csv(self):
+        """Asks for a folder of bulk data CSV files and loads them into the database."""
+        directory = input("Folder of bulk data CSV files: ").strip().strip('"')
+        if os.path.isdir(directory):
+            days = self.scraping_actor.ingest_csv(directory)
+            print(f"Loaded {days} days.")
+        else:
+            print("That folder doesnt exist.")
+
+    def fetch_stations(self):
+        """Asks for a list of station ids and downloads them all together."""
+        station_ids = [
+            station.strip()
+            for station in input("Station ids, comma separated: ").split(",")
+            if station.strip()
+        ]
+        if not station_ids or not all(station.isdigit() for station in station_ids):
+            print("Station ids must be numbers separated by commas.")
+            return
+
+        progress = self.scraping_actor.fetch_stations(station_ids)
+        for station_id, (done, total) in progress.items():
+            print(f"Station {station_id}: {done} of {total} months.")
+
+    def refresh_range(self):
+        """Asks for a range of months and re-downloads only those months."""
+        try:
+            start = [int(part) for part in input("First month (YYYY-MM): ").split("-")]
+            end = [int(part) for part in input("Last month (YYYY-MM): ").split("-")]
+            if len(start) != 2 or len(end) != 2:
+                raise ValueError("Months must be YYYY-MM.")
+            if not (1 <= start[1] <= 12 and 1 <= end[1] <= 12):
+                raise ValueError("Months must be 01 to 12.")
+        except ValueError:
+            print("Months must be entered as YYYY-MM.")
+            return
+
+        failed = self.scraping_actor.refresh_range(start=start, end=end)
+        if failed:
+            print(f"{len(failed)} months couldnt be downloaded and were left unchanged.")
+
     #
     #   HELPER METHODS below
     #
@@ -304,20 +355,77 @@ class WeatherProcessor:
 
         Initiates the creation of a box plot for weather data based on user input.
         """
+        from plot_operations import PlotOperations  # pylint: disable=import-outside-toplevel
+
         # the asterisk makes the tuple puke up its contents regardless of the variable
         # parameter names.  *tuple(y,x) => method(x,y) = result method(y,x)
         # The example method above expects x as the first param
-        PlotOperations().create(*self.get_input())
+        PlotOperations().create(
+            *self.get_input(), station_id=self.scraping_actor.station_id
+        )
+
+    def range_plot(self):
+        """Asks for a range of dates and plots the daily averages between them."""
+        from plot_operations import PlotOperations  # pylint: disable=import-outside-toplevel
+
+        start_date = input("First day (YYYY-MM-DD, blank for the first saved): ").strip()
+        end_date = input("Last day (YYYY-MM-DD, blank for the last saved): ").strip()
+        PlotOperations().create_range(
+            start_date or None, end_date or None, station_id=self.scraping_actor.station_id
+        )
+
+    def show_trends(self):
+        """Prints the current stations warming trend for each calendar month."""
+        from trends import TrendAnalysis  # pylint: disable=import-outside-toplevel
+
+        trends = TrendAnalysis(self.scraping_actor.weather_db).station_trends(
+            self.scraping_actor.station_id
+        )
+        if trends is None:
+            print("No data to find trends in.")
+            return
+
+        monthly = trends["month"]
+        print(f"Warming trends {trends['first_year']} to {trends['last_year']} (°C/decade)")
+        for month, (slope, low, high, years) in enumerate(
+            zip(monthly["slope"], monthly["low"], monthly["high"], monthly["years"]), start=1
+        ):
+            print(f"{month:>2}: {slope:+.2f}  95% {low:+.2f} to {high:+.2f}  ({years} years)")
+
+    def export_rolling(self):
+        """Writes the current stations 7, 30 and 365 day rolling statistics to a CSV file."""
+        path = input("CSV file to write: ").strip().strip('"')
+        if not path:
+            return
+
+        from rolling import RollingStatistics  # pylint: disable=import-outside-toplevel
+
+        engine = RollingStatistics(self.scraping_actor.weather_db)
+        result = engine.rolling(self.scraping_actor.station_id)
+        if result is None:
+            print("No data to export.")
+            return
+        try:
+            engine.export_csv(result, path)
+            print(f"Wrote {len(result['day'])} days to {path}.")
+        except OSError as error:
+            print(f"Couldnt write {path}: {error}")
 
     def line_plot(self):
         """Generates a line plot.
 
         Initiates the creation of a line plot for weather data based on user input.
         """
+        from plot_operations import PlotOperations  # pylint: disable=import-outside-toplevel
+
         start_year, month = self.get_input(True)
-        PlotOperations().create(start_year, month=month)
+        PlotOperations().create(
+            start_year, month=month, station_id=self.scraping_actor.station_id
+        )
 
 
 if __name__ == "__main__":
+    # Lets the frozen executable start process pool workers.
+    multiprocessing.freeze_support()
     weatherProcessor = WeatherProcessor()
     weatherProcessor.start_main()